@@ -0,0 +1,292 @@
+'''Benchmark the scraper against a replayed or synthetic wiki, stage by stage and end to end.
+
+    python -m benchmarks.bench_scraper --pages 10000 100000 1000000 --latency 0.02 --error-rate 0.01
+    python -m benchmarks.bench_scraper --fixture benchmarks/fixtures/coronationstreet.jsonl.gz
+    python -m benchmarks.bench_scraper --pages 10000 --save baseline.json
+    python -m benchmarks.bench_scraper --pages 10000 --compare baseline.json
+    python -m benchmarks.bench_scraper --pages 10000 100000 --parse-workers 1 2 4 8 --parse-batches 1 4 16
+    python -m benchmarks.bench_scraper --pages 1000000 --stages dump --dump-page-bytes 3000
+
+Each stage reports its wall time, pages per second, the peak RSS it added and the requests it made;
+parsing stages also report the MB/s of wikitext parsed.
+With --compare, a stage that is slower or uses more memory than the baseline by more than --tolerance
+is reported as a regression and the exit status is 1.
+With --parse-workers, the pages are fetched once and parsed serially, then on a process pool of each size
+(with each of --parse-batches batches per worker), to show how parsing scales with cores.
+The dump stage writes the synthetic wiki as an XML dump (pages padded to --dump-page-bytes; about 3 GB for
+a million pages at 3000) and times build() reading it, in pages/s & MB/s of dump.
+'''
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from main import CATEGORIES, FANDOM_SITE, TITLES_LIMIT, WikiInfobox, parse_infoboxes_parallel
+from benchmarks.replay import RecordedWiki, ReplayServer, SyntheticWiki
+
+STAGES = ['list', 'fetch', 'match', 'parse', 'sort', 'dataframes', 'write json', 'stream jsonl', 'generator',
+          'end to end', 'dump']
+
+
+def current_rss():
+    '''Resident set size of this process in bytes (the peak so far where /proc isn't available).'''
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class PeakMemory:
+    '''Sample the process RSS on a background thread while in use, keeping the peak above the starting RSS.'''
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.start = self.peak = 0
+        self.done = threading.Event()
+
+    def sample(self):
+        while not self.done.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def __enter__(self):
+        gc.collect()
+        self.start = self.peak = current_rss()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.done.set()
+        self.thread.join()
+        self.peak = max(self.peak, current_rss())
+
+    @property
+    def added(self):
+        return self.peak - self.start
+
+
+class StageBenchmark:
+    '''Run the scraper's stages one after another against `server`, timing each.'''
+    def __init__(self, server, size, fandom_site, categories, concurrency=8, directory=None, dump_page_bytes=0,
+                 **options):
+        self.server = server
+        self.dump_page_bytes = dump_page_bytes
+        self.options = options
+        self.size = size
+        self.fandom_site = fandom_site
+        self.categories = categories
+        self.concurrency = concurrency
+        self.directory = directory or tempfile.mkdtemp(prefix='fandom_bench_')
+        self.results = []
+
+    def infobox(self, **options):
+        return WikiInfobox(fandom_site=self.fandom_site, fandom_url=self.server.url, api_url=self.server.api_url,
+                           categories=self.categories, recursive=True, rate_limit=None,
+                           max_concurrency=self.concurrency, maxlag=None, backoff_factor=0.01,
+                           write_report=False, json_file=os.path.join(self.directory, f'{self.fandom_site}.json'),
+                           **dict(self.options, **options))
+
+    def measure(self, stage, wi, func, nbytes=None):
+        requests_before = wi.metrics.counters.get('requests', 0)
+        # keep the scraper's progress bars & messages out of the results
+        with PeakMemory() as memory, contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            start = time.perf_counter()
+            func()
+            seconds = time.perf_counter() - start
+        pages = len(wi.titles) if wi.titles else self.size
+        result = {'size': self.size,
+                  'stage': stage,
+                  'pages': pages,
+                  'seconds': round(seconds, 4),
+                  'pages_per_second': round(pages / seconds, 1) if seconds else None,
+                  'peak_mb': round(memory.added / 2**20, 1),
+                  'requests': wi.metrics.counters.get('requests', 0) - requests_before,
+                  }
+        if nbytes is not None:
+            result['mb_per_second'] = round(nbytes / 2**20 / seconds, 1) if seconds else None
+        self.results.append(result)
+        print_result(result)
+        return result
+
+    def run(self, stages=STAGES):
+        wi = self.infobox()
+
+        def fetch():
+            wi.raw_infoboxes = wi.get_raw_infoboxes(progress=False)
+
+        def match():
+            wi.matched_raw_infoboxes = wi.match_names_to_infoboxes()
+
+        def parse():
+            if wi.compact_records:
+                wi.infoboxes = wi.get_infobox_stores()
+            else:
+                wi.unsorted_infoboxes = wi.get_parsed_infoboxes()
+
+        def sort():
+            # compact records are collected per template as they're parsed, so have nothing to sort
+            if not wi.compact_records:
+                wi.infoboxes = wi.sort_infoboxes_by_template()
+
+        def dataframes():
+            wi.dfs = wi.build_dfs_infobox()
+
+        pipeline = [('list', wi.get_page_list), ('fetch', fetch), ('match', match), ('parse', parse),
+                    ('sort', sort), ('dataframes', dataframes), ('write json', wi.write_infobox_json)]
+        # each stage needs the ones before it, so they all run, but only those asked for are reported
+        for stage, func in pipeline if any(stage in stages for stage, _ in pipeline) else []:
+            if stage in stages:
+                nbytes = wikitext_bytes(wi.matched_raw_infoboxes) if stage == 'parse' else None
+                self.measure(stage, wi, func, nbytes)
+            else:
+                with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                    func()
+        del wi
+        gc.collect()
+
+        if 'stream jsonl' in stages:
+            wi = self.infobox()
+            self.measure('stream jsonl', wi,
+                         lambda: wi.build_stream(os.path.join(self.directory, f'{self.fandom_site}.jsonl'), fmt='jsonl'))
+            del wi
+            gc.collect()
+
+        if 'generator' in stages:
+            # listing & content fetched together, in place of the list, fetch & match stages
+            wi = self.infobox(use_generator=True)
+            self.measure('generator', wi, wi.scrape)
+            del wi
+            gc.collect()
+
+        if 'end to end' in stages:
+            wi = self.infobox()
+
+            def end_to_end():
+                wi.build()
+                wi.write_infobox_json()
+            self.measure('end to end', wi, end_to_end)
+            del wi
+            gc.collect()
+
+        if 'dump' in stages and hasattr(self.server.wiki, 'write_dump'):
+            path = os.path.join(self.directory, f'{self.fandom_site}.xml')
+            self.server.wiki.write_dump(path, self.dump_page_bytes)
+            wi = self.infobox(dump_file=path)
+            try:
+                self.measure('dump', wi, wi.build, os.path.getsize(path))
+            finally:
+                os.remove(path)
+        return self.results
+
+    def run_parse_scaling(self, workers=(1, 2, 4), batches_per_worker=(16,)):
+        '''Fetch the pages once, then time parsing them serially and on process pools of each size.'''
+        wi = self.infobox()
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            wi.get_page_list()
+            wi.raw_infoboxes = wi.get_raw_infoboxes(progress=False)
+            matched = wi.match_names_to_infoboxes()
+        nbytes = wikitext_bytes(matched)
+        self.measure('parse serial', wi,
+                     lambda: {k: wi.parse_infobox(v, standardize_case=wi.standardize_case) for k, v in matched.items()},
+                     nbytes)
+        for n in workers:
+            for batches in batches_per_worker:
+                self.measure(f'parse {n}w {batches}b', wi,
+                             lambda: parse_infoboxes_parallel(matched, wi.standardize_case, workers=n,
+                                                              batches_per_worker=batches), nbytes)
+        return self.results
+
+
+def wikitext_bytes(raw_infoboxes):
+    return sum(len(text.encode()) for text in raw_infoboxes.values())
+
+
+def print_result(result):
+    rate = f"{result['pages_per_second']:>12,.0f}" if result['pages_per_second'] else f"{'-':>12}"
+    throughput = f" {result['mb_per_second']:>7.1f} MB/s" if result.get('mb_per_second') else ''
+    print(f"{result['size']:>9,} {result['stage']:<13} {result['seconds']:>9.2f}s {rate} pages/s "
+          f"{result['peak_mb']:>8.1f} MB {result['requests']:>7,} requests{throughput}")
+
+
+def compare(results, baseline, tolerance=0.2):
+    '''Stages of `results` slower, or using more memory, than in `baseline` by more than `tolerance`.'''
+    before = {(r['size'], r['stage']): r for r in baseline}
+    regressions = []
+    for result in results:
+        old = before.get((result['size'], result['stage']))
+        if old is None:
+            continue
+        if result['seconds'] > old['seconds'] * (1 + tolerance) and result['seconds'] - old['seconds'] > 0.05:
+            regressions.append(f"{result['size']:,} pages {result['stage']}: "
+                               f"{old['seconds']:.2f}s -> {result['seconds']:.2f}s")
+        if result['peak_mb'] > old['peak_mb'] * (1 + tolerance) and result['peak_mb'] - old['peak_mb'] > 5:
+            regressions.append(f"{result['size']:,} pages {result['stage']}: "
+                               f"{old['peak_mb']:.1f} MB -> {result['peak_mb']:.1f} MB")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, nargs='+', default=[10000], help='sizes of synthetic wikis to benchmark')
+    parser.add_argument('--subcats', type=int, default=10, help='subcategories the synthetic pages are spread over')
+    parser.add_argument('--fixture', help='replay this recorded fixture instead of a synthetic wiki')
+    parser.add_argument('--site', default=FANDOM_SITE, help='site the fixture was recorded from')
+    parser.add_argument('--category', action='append', dest='categories', help='category the fixture was recorded for')
+    parser.add_argument('--batch-size', type=int,
+                        help='titles per query; a fixture is replayed with the 50 it is recorded with by default')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='up to this many more seconds, at random')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests that fail')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--stages', nargs='+', default=STAGES, choices=STAGES, metavar='STAGE')
+    parser.add_argument('--dict-records', action='store_true', help='parse into dicts per page, not InfoboxStores')
+    parser.add_argument('--dump-page-bytes', type=int, default=0, help='pad pages of the dump stage to this size')
+    parser.add_argument('--parse-workers', type=int, nargs='+',
+                        help='only benchmark parsing, serially and on process pools of these sizes')
+    parser.add_argument('--parse-batches', type=int, nargs='+', default=[16],
+                        help='batches per worker to try with --parse-workers')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='compare the results against this saved JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    options = {'compact_records': not args.dict_records, 'batch_size': args.batch_size}
+    if args.fixture:
+        runs = [(RecordedWiki(args.fixture), 0, args.site, args.categories or CATEGORIES)]
+        # only the batches of titles recorded can be replayed, so they mustn't be sized by timing
+        options['batch_size'] = args.batch_size or TITLES_LIMIT
+    else:
+        runs = [(SyntheticWiki(n, subcats=args.subcats), n, f'synthetic{n}', ['Characters']) for n in args.pages]
+    print(f"{'pages':>9} {'stage':<13} {'time':>10} {'rate':>12} pages/s {'memory':>11} {'requests':>16}")
+    results = []
+    for wiki, size, site, categories in runs:
+        with ReplayServer(wiki, args.latency, args.jitter, args.error_rate) as server:
+            benchmark = StageBenchmark(server, size, site, categories, args.concurrency,
+                                       dump_page_bytes=args.dump_page_bytes, **options)
+            if args.parse_workers:
+                results += benchmark.run_parse_scaling(args.parse_workers, args.parse_batches)
+            else:
+                results += benchmark.run(args.stages)
+            if server.stats['errors']:
+                print(f"{server.stats['errors']:,} of {server.stats['requests']:,} responses were injected errors")
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=4)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f'Regression: {regression}')
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,458 @@
+'''Record the fandom API responses a scrape makes, and replay them (or a synthetic wiki) from a local HTTP stand-in.
+
+Record once against the live site:
+    python -m benchmarks.replay record benchmarks/fixtures/coronationstreet.jsonl.gz
+Then serve the fixture, or a synthetic wiki, with injected latency & errors:
+    python -m benchmarks.replay serve benchmarks/fixtures/coronationstreet.jsonl.gz --latency 0.05 --error-rate 0.01
+    python -m benchmarks.replay serve --pages 100000
+and point a scraper at it with WikiInfobox(fandom_url=server.url, api_url=server.api_url, ...).
+A synthetic wiki can also be written as an XML dump, for WikiInfobox(dump_file=...):
+    python -m benchmarks.replay dump synthetic.xml.bz2 --pages 1000000 --subcats 10 --page-bytes 3000
+'''
+import argparse
+import bz2
+import gzip
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qsl, unquote
+from xml.sax.saxutils import escape
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from main import CATEGORIES, FANDOM_SITE, NAMESPACES, TITLES_LIMIT, WikiInfobox
+
+# query parameters that don't change a response, so are left out of fixture keys
+IGNORED_PARAMS = {'maxlag'}
+
+
+def request_key(path, params):
+    '''The fixture key of a request: its path & query parameters, in a stable order.'''
+    params = sorted((k, v) for k, v in params if k not in IGNORED_PARAMS)
+    return json.dumps([unquote(path), params])
+
+
+def open_fixture(path, mode='rt'):
+    return gzip.open(path, mode) if path.endswith('.gz') else open(path, mode)
+
+
+def record(path, fandom_site=FANDOM_SITE, categories=None, recursive=False, all_pages=True, **options):
+    '''Scrape `categories` from the live site, saving every API response to a JSON lines fixture at `path`.
+    Also records the siteinfo namespaces and, with `all_pages`, the allpages listing.
+    `options` are passed on to the `WikiInfobox` doing the scrape. Its batches of titles are pinned at
+    `batch_size` (default 50) rather than sized by how fast the site answers, so a replay made with the same
+    `batch_size` asks for exactly the batches recorded.'''
+    if categories is None:
+        categories = CATEGORIES
+    options.setdefault('batch_size', TITLES_LIMIT)
+    wi = WikiInfobox(fandom_site=fandom_site, categories=categories, recursive=recursive, write_report=False,
+                     **options)
+    base = urlsplit(wi.fandom_url).path
+    recorded = {}
+
+    def save_response(response, *args, **kwargs):
+        request = response.request
+        url = urlsplit(request.url)
+        params = parse_qsl(url.query, keep_blank_values=True)
+        if request.body:
+            body = request.body.decode() if isinstance(request.body, bytes) else request.body
+            params += parse_qsl(body, keep_blank_values=True)
+        if response.status_code == 200:
+            recorded[request_key(url.path[len(base):], params)] = response.text
+
+    wi.session.hooks['response'].append(save_response)
+    wi.get_all_namespaces()
+    if all_pages:
+        wi.get_all_pages()
+    wi.scrape()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open_fixture(path, 'wt') as f:
+        for key, body in recorded.items():
+            f.write(json.dumps({'key': key, 'body': body}) + '\n')
+    print(f'Recorded {len(recorded)} responses to {path}')
+    return len(recorded)
+
+
+class RecordedWiki:
+    '''Answers requests with the responses saved by `record()`. Scrape it with the `batch_size` it was recorded
+    with: batches of other titles weren't recorded, so are answered with a 404.'''
+    def __init__(self, path):
+        self.responses = {}
+        with open_fixture(path) as f:
+            for line in f:
+                entry = json.loads(line)
+                self.responses[entry['key']] = entry['body']
+
+    def respond(self, path, params):
+        '''The (status, body) for a request; 404 if it wasn't recorded.'''
+        body = self.responses.get(request_key(path, params))
+        if body is None:
+            return 404, json.dumps({'error': {'code': 'notrecorded', 'info': 'request not in fixture'}})
+        return 200, body
+
+
+# filler for the body of synthetic dump pages, which on a real wiki dwarfs the infobox
+PROSE = ("Some prose about the [[character]] and their (long) history on the street, with a [[Link|label]] "
+         "or two and a {{Citation needed}}.\n")
+
+
+def write_dump_page(f, pageid, title, ns, text):
+    f.write(f'  <page>\n    <title>{escape(title)}</title>\n    <ns>{ns}</ns>\n    <id>{pageid}</id>\n'
+            f'    <revision>\n      <id>{pageid * 10 + 1}</id>\n'
+            f'      <text bytes="{len(text.encode())}" xml:space="preserve">{escape(text)}</text>\n'
+            f'    </revision>\n  </page>\n')
+
+
+class SyntheticWiki:
+    '''A generated wiki of `n_pages` character pages titled "Character <n>", listed in the category
+    `category` (split evenly over `subcats` subcategories of it, if any). Responses are built on demand,
+    so even million-page wikis cost no memory up front.
+    Roughly 5% of pages use a second infobox template and 1% have no infobox.
+    Like MediaWiki, queries by title take at most 50 titles (500 with `high_limits`, as for bots) and a
+    response stops adding content past `max_result_bytes`.'''
+    def __init__(self, n_pages=10000, category='Characters', subcats=0, limit=500, content_limit=50,
+                 high_limits=False, max_result_bytes=8 * 2**20):
+        self.n_pages = n_pages
+        self.category = category
+        self.subcats = subcats
+        self.limit = limit
+        self.content_limit = content_limit
+        self.high_limits = high_limits
+        self.max_result_bytes = max_result_bytes
+
+    def title(self, i):
+        return f'Character {i}'
+
+    def write_dump(self, path, page_bytes=0):
+        '''Write the wiki as a MediaWiki XML export (bz2 or gzip compressed if `path` ends in .bz2 or .gz),
+        with the category pages & [[Category:...]] links a dump scrape follows. Each page is padded with prose
+        to about `page_bytes`. Pages are written one at a time, so any size of dump can be made.'''
+        opener = bz2.open if path.endswith('.bz2') else gzip.open if path.endswith('.gz') else open
+        size = -(-self.n_pages // self.subcats) if self.subcats else None
+        with opener(path, 'wt', encoding='utf-8') as f:
+            f.write('<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.11/" version="0.11" xml:lang="en">\n'
+                    '  <siteinfo>\n    <sitename>Synthetic</sitename>\n  </siteinfo>\n')
+            for j in range(1, self.subcats + 1):
+                write_dump_page(f, self.n_pages + j, f'Category:{self.category} {j}', 14,
+                                f'[[Category:{self.category}]]')
+            for i in range(1, self.n_pages + 1):
+                category = f'{self.category} {(i - 1) // size + 1}' if size else self.category
+                text = self.text(i)
+                if len(text) < page_bytes:
+                    text += PROSE * -(-(page_bytes - len(text)) // len(PROSE))
+                write_dump_page(f, i, self.title(i), 0, f'{text}\n[[Category:{category}]]\n')
+            f.write('</mediawiki>\n')
+
+    def normalize(self, title):
+        '''A title as MediaWiki normalizes it on a wiki with $wgCapitalLinks: underscores as spaces, runs of
+        spaces collapsed & a capital first letter, after any namespace prefix.'''
+        title = ' '.join(title.replace('_', ' ').split())
+        namespace, colon, name = title.rpartition(':')
+        if namespace:
+            namespace = namespace[:1].upper() + namespace[1:].lower()
+        return namespace + colon + name[:1].upper() + name[1:]
+
+    def pageid(self, title):
+        '''The pageid of a title, or None if the wiki has no such page.'''
+        prefix, _, number = title.replace('_', ' ').rpartition(' ')
+        if prefix == 'Character' and number.isdigit() and 1 <= int(number) <= self.n_pages:
+            return int(number)
+        return None
+
+    def revid(self, i):
+        return i * 10 + 1
+
+    def text(self, i):
+        if i % 100 == 0:
+            return f'A page about character {i} with no infobox.\n== History ==\n'
+        template = 'Infobox actor' if i % 20 == 0 else 'Infobox character'
+        return (f'{{{{{template}\n'
+                f'|character name = Character {i}\n'
+                f'|image = [[File:Character {i}.jpg|150px]]\n'
+                f'|played by = [[Actor {i % 5000}]]\n'
+                f'|first appearance = [[Episode {i % 9000 + 1}|{1 + i % 28}th January {1960 + i % 60}]]\n'
+                f'|last appearance = [[Episode {i % 9000 + 50}]]\n'
+                f'|number of appearances = {i % 3000}\n'
+                f'|born = {1 + i % 28}th March {1900 + i % 100}\n'
+                f'|spouse(s) = [[Character {(i * 7) % self.n_pages + 1}]] (1990-91)<br>[[Character {(i * 13) % self.n_pages + 1}]]\n'
+                f'|father = [[Character {(i * 3) % self.n_pages + 1}]]\n'
+                f'}}}}\n'
+                f"'''Character {i}''' is a character.\n== History ==\n")
+
+    def category_members(self, category):
+        '''(subcategory names, pageid range) of a category.'''
+        if category == self.category:
+            if self.subcats:
+                return [f'{self.category} {j}' for j in range(1, self.subcats + 1)], range(0)
+            return [], range(1, self.n_pages + 1)
+        prefix, _, number = category.rpartition(' ')
+        if self.subcats and prefix == self.category and number.isdigit() and 1 <= int(number) <= self.subcats:
+            j = int(number)
+            size = -(-self.n_pages // self.subcats)
+            return [], range((j - 1) * size + 1, min(j * size, self.n_pages) + 1)
+        return [], range(0)
+
+    def members_page(self, category, start, limit):
+        '''One page of a category's members as dicts, and the next continue offset or None.'''
+        subcats, pageids = self.category_members(category)
+        end = start + limit
+        members = [{'pageid': 10**9 + k, 'ns': 14, 'title': f'Category:{name}'}
+                   for k, name in enumerate(subcats) if start <= k < end]
+        members += [{'pageid': i, 'ns': 0, 'title': self.title(i)}
+                    for i in pageids[max(0, start - len(subcats)):max(0, end - len(subcats))]]
+        return members, (end if end < len(subcats) + len(pageids) else None)
+
+    def page(self, i, title, prop):
+        page = {'pageid': i, 'ns': 0, 'title': title}
+        if 'info' in prop:
+            page.update({'lastrevid': self.revid(i), 'length': len(self.text(i))})
+        if 'revisions' in prop:
+            page['revisions'] = [{'revid': self.revid(i), 'slots': {'main': {'contentmodel': 'wikitext',
+                                                                              'contentformat': 'text/x-wiki',
+                                                                              '*': self.text(i)}}}]
+        return page
+
+    def titles_query(self, titles, prop):
+        '''Answer a query by titles, truncating the list past the titles limit and the content past
+        `max_result_bytes` as MediaWiki does.'''
+        out = {}
+        limit = 500 if self.high_limits else 50
+        if len(titles) > limit:
+            titles = titles[:limit]
+            out['warnings'] = {'main': {'*': f'Too many values supplied for parameter "titles". The limit is {limit}.'}}
+        pages = {}
+        normalized = []
+        size = 0
+        for j, requested in enumerate(titles):
+            title = self.normalize(requested)
+            if title != requested:
+                normalized.append({'from': requested, 'to': title})
+            i = self.pageid(title)
+            if i is None:
+                pages[str(-1 - j)] = {'ns': 0, 'title': title, 'missing': ''}
+                continue
+            page = self.page(i, title, prop if size <= self.max_result_bytes else prop - {'revisions'})
+            if 'revisions' in page:
+                size += len(page['revisions'][0]['slots']['main']['*'])
+            elif 'revisions' in prop and 'continue' not in out:
+                out['continue'] = {'rvcontinue': f'{i}|0', 'continue': '||'}
+            pages[str(i)] = page
+        out['query'] = {'pages': pages}
+        if normalized:
+            out['query']['normalized'] = normalized
+        return out
+
+    def generate(self, q, prop):
+        '''Answer a generator=allpages or generator=categorymembers query. As on MediaWiki, at most
+        `content_limit` pages of a batch get their revision content; the rest follow in responses that
+        repeat the batch with an rvcontinue.'''
+        prefix = 'gap' if q['generator'] == 'allpages' else 'gcm'
+        start = q.get(prefix + 'continue') or 0
+        start = 0 if start == '0' else int(start)
+        limit = min(int(q.get(prefix + 'limit', self.limit)), self.limit)
+        if prefix == 'gap':
+            members = [{'pageid': i, 'ns': 0, 'title': self.title(i)}
+                       for i in range(start + 1, min(start + limit, self.n_pages) + 1)]
+            next_start = start + limit if start + limit < self.n_pages else None
+        else:
+            category = q['gcmtitle'].replace('_', ' ').split(':', 1)[-1]
+            members, next_start = self.members_page(category, start, limit)
+            if 'subcat' not in q.get('gcmtype', 'subcat|page'):
+                members = [m for m in members if m['ns'] != 14]
+        articles = [m for m in members if m['ns'] == 0]
+        rest = []
+        if 'revisions' in prop:
+            first = int(q['rvcontinue'].split('|')[0]) if q.get('rvcontinue') else 0
+            articles = [m for m in articles if m['pageid'] >= first]
+            articles, rest = articles[:self.content_limit], articles[self.content_limit:]
+        with_content = {m['pageid'] for m in articles}
+        pages = {}
+        for m in members:
+            if m['ns'] == 0:
+                m = self.page(m['pageid'], m['title'], prop if m['pageid'] in with_content else prop - {'revisions'})
+            pages[str(m['pageid'])] = m
+        out = {'query': {'pages': pages}}
+        if rest:
+            out['continue'] = {'rvcontinue': f"{rest[0]['pageid']}|0", prefix + 'continue': str(start),
+                               'continue': prefix + 'continue||'}
+        elif next_start is not None:
+            out['continue'] = {prefix + 'continue': str(next_start), 'continue': '-||'}
+        return out
+
+    def respond(self, path, params):
+        '''The (status, body) for a request.'''
+        q = dict(params)
+        if q.get('action') == 'raw' or (path.strip('/') and path.strip('/') != 'api.php'):
+            i = self.pageid(unquote(path).strip('/'))
+            if i is None:
+                return 404, ''
+            return 200, self.text(i)
+        if q.get('action') != 'query':
+            return 400, json.dumps({'error': {'code': 'badaction', 'info': 'unsupported action'}})
+        out = {}
+        prop = set(q.get('prop', '').split('|'))
+        if q.get('meta') == 'siteinfo':
+            out = {'query': {'namespaces': {k: {'id': int(k), 'canonical': v, '*': v} for k, v in NAMESPACES}}}
+        elif q.get('meta') == 'userinfo':
+            rights = ['read', 'apihighlimits'] if self.high_limits else ['read']
+            out = {'query': {'userinfo': {'id': 0, 'name': '127.0.0.1', 'anon': '', 'rights': rights}}}
+        elif q.get('list') == 'allpages':
+            start = 0 if q.get('apcontinue', '0') == '0' else int(q['apcontinue'])
+            limit = min(int(q.get('aplimit', self.limit)), self.limit)
+            ids = range(start + 1, min(start + limit, self.n_pages) + 1)
+            out = {'query': {'allpages': [{'pageid': i, 'ns': 0, 'title': self.title(i)} for i in ids]}}
+            if start + limit < self.n_pages:
+                out['continue'] = {'apcontinue': str(start + limit), 'continue': '-||'}
+        elif q.get('list') == 'categorymembers':
+            category = q['cmtitle'].replace('_', ' ').split(':', 1)[-1]
+            limit = min(int(q.get('cmlimit', self.limit)), self.limit)
+            members, next_start = self.members_page(category, int(q.get('cmcontinue') or 0), limit)
+            out = {'query': {'categorymembers': members}}
+            if next_start is not None:
+                out['continue'] = {'cmcontinue': str(next_start), 'continue': '-||'}
+        elif q.get('generator') in ('allpages', 'categorymembers'):
+            out = self.generate(q, prop)
+        elif 'titles' in q:
+            out = self.titles_query(q['titles'].split('|'), prop)
+        else:
+            return 400, json.dumps({'error': {'code': 'badquery', 'info': 'unsupported query'}})
+        if 'continue' not in out:
+            out['batchcomplete'] = ''
+        return 200, json.dumps(out)
+
+
+class ReplayServer:
+    '''Serve a `RecordedWiki` or `SyntheticWiki` over HTTP on a background thread.
+    Every response is delayed by `latency` seconds (plus up to `jitter` more). A fraction `error_rate` of
+    requests instead fail, at random, with a 503, a 429 with Retry-After, or a maxlag error.
+    GET requests longer than `max_url_length` are refused with a 414, as by most front-end proxies.
+    Use as a context manager, or call start() & stop().'''
+    def __init__(self, wiki, latency=0.0, jitter=0.0, error_rate=0.0, seed=0, host='127.0.0.1', port=0,
+                 max_url_length=8192):
+        self.wiki = wiki
+        self.max_url_length = max_url_length
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'errors': 0, 'bytes': 0}
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if len(self.path) > server.max_url_length:
+                    server.handle(self, None, [])
+                    return
+                url = urlsplit(self.path)
+                server.handle(self, url.path, parse_qsl(url.query, keep_blank_values=True))
+
+            def do_POST(self):
+                url = urlsplit(self.path)
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode()
+                server.handle(self, url.path, parse_qsl(url.query, keep_blank_values=True)
+                              + parse_qsl(body, keep_blank_values=True))
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f'http://{host}:{self.httpd.server_address[1]}'
+        self.api_url = self.url + '/api.php'
+        self.thread = None
+
+    def handle(self, handler, path, params):
+        with self.lock:
+            self.stats['requests'] += 1
+            fail = self.random.random() < self.error_rate
+            kind = self.random.randrange(3)
+            delay = self.latency + self.random.random() * self.jitter
+        if delay:
+            time.sleep(delay)
+        headers = {'Content-Type': 'application/json; charset=utf-8'}
+        if path is None:
+            status, body = 414, 'Request-URI Too Long'
+        elif fail:
+            with self.lock:
+                self.stats['errors'] += 1
+            if kind == 0:
+                status, body = 503, 'Service Unavailable'
+            elif kind == 1:
+                status, body = 429, 'Too Many Requests'
+                headers['Retry-After'] = '0'
+            else:
+                status, body = 200, json.dumps({'error': {'code': 'maxlag', 'info': 'Waiting for a database server'}})
+                headers.update({'MediaWiki-API-Error': 'maxlag', 'Retry-After': '0'})
+        else:
+            status, body = self.wiki.respond(path, params)
+        data = body.encode()
+        with self.lock:
+            self.stats['bytes'] += len(data)
+        handler.send_response(status)
+        for k, v in headers.items():
+            handler.send_header(k, v)
+        handler.send_header('Content-Length', str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    rec = commands.add_parser('record', help='record the live API responses of a scrape')
+    rec.add_argument('fixture')
+    rec.add_argument('--site', default=FANDOM_SITE)
+    rec.add_argument('--category', action='append', dest='categories')
+    rec.add_argument('--recursive', action='store_true')
+    rec.add_argument('--no-allpages', action='store_false', dest='all_pages')
+    serve = commands.add_parser('serve', help='serve a fixture, or a synthetic wiki, over HTTP')
+    serve.add_argument('fixture', nargs='?')
+    serve.add_argument('--pages', type=int, default=10000, help='size of the synthetic wiki if no fixture is given')
+    serve.add_argument('--subcats', type=int, default=0)
+    serve.add_argument('--latency', type=float, default=0.0)
+    serve.add_argument('--jitter', type=float, default=0.0)
+    serve.add_argument('--error-rate', type=float, default=0.0)
+    serve.add_argument('--port', type=int, default=8765)
+    dump = commands.add_parser('dump', help='write a synthetic wiki as an XML dump')
+    dump.add_argument('path')
+    dump.add_argument('--pages', type=int, default=10000)
+    dump.add_argument('--subcats', type=int, default=0)
+    dump.add_argument('--page-bytes', type=int, default=0, help='pad each page with prose to about this size')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record(args.fixture, args.site, args.categories, args.recursive, args.all_pages)
+    elif args.command == 'dump':
+        SyntheticWiki(args.pages, subcats=args.subcats).write_dump(args.path, args.page_bytes)
+    else:
+        wiki = RecordedWiki(args.fixture) if args.fixture else SyntheticWiki(args.pages, subcats=args.subcats)
+        server = ReplayServer(wiki, args.latency, args.jitter, args.error_rate, port=args.port)
+        print(f'Serving on {server.api_url}')
+        try:
+            server.httpd.serve_forever()
+        except KeyboardInterrupt:
+            server.stop()
@@ -0,0 +1,313 @@
+'''A memory-mapped inverted index over scraped infoboxes, queried without parsing the JSON or importing pandas.
+
+The index maps each (field, normalized value) to the pages setting it, and keeps the numbers (episode numbers,
+counts) and dates found in values sorted for range queries. `WikiInfobox.write_infobox_json()` writes one next
+to its JSON; to index an existing JSON file, or query one from the command line:
+    python infobox_index.py build projects/coronationstreet.json
+    python infobox_index.py lookup projects/coronationstreet.idx "played by" "William Roache"
+    python infobox_index.py range projects/coronationstreet.idx "first appearance" 1 10
+
+    with InfoboxIndex('projects/coronationstreet.idx') as index:
+        index.lookup('played by', 'William Roache')       # [(pageid, title), ...]
+        index.prefix('character name', 'ken')
+        index.range('first appearance', 1, 10)            # episodes 1-10
+        index.date_range('born', '1940-01-01', '1949-12-31')
+'''
+import argparse
+import json
+import mmap
+import os
+import re
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+
+MAGIC = b'FIDX0001'
+MONTHS = {m: i for i, m in enumerate(['january', 'february', 'march', 'april', 'may', 'june', 'july', 'august',
+                                      'september', 'october', 'november', 'december'], 1)}
+# the number a value stands for: an episode ("Episode 1680 |21st February 1977"), a bare count, or a count
+# given as a link's label ("Ken Barlow - List of appearances|4572 as of ...")
+NUMBER_VALUE = re.compile(r'^\s*(?:Episode\s+)?(\d+(?:\.\d+)?)\s*(?:\||$)|^[^|]*\|\s*(\d+)\b', re.IGNORECASE)
+DATE_VALUE = re.compile(r'\b(\d{1,2})(?:st|nd|rd|th)?\s+(' + '|'.join(MONTHS) + r')\s+(\d{4})\b', re.IGNORECASE)
+ISO_DATE = re.compile(r'^(\d{4})-(\d{2})-(\d{2})')
+
+
+def normalize_value(value):
+    '''Case- & whitespace-insensitive form of a value, as looked up in the index.'''
+    return ' '.join(str(value).split()).lower()
+
+
+def number_key(value):
+    match = NUMBER_VALUE.match(value)
+    return float(match.group(1) or match.group(2)) if match else None
+
+
+def date_key(value):
+    '''The first "21st February 1977"-style date in a value as a yyyymmdd integer, or None.'''
+    for day, month, year in DATE_VALUE.findall(value):
+        if 1 <= int(day) <= 31:
+            return int(year) * 10000 + MONTHS[month.lower()] * 100 + int(day)
+    return None
+
+
+def as_date_key(date):
+    '''A yyyymmdd integer from a date, datetime or 'YYYY-MM-DD' string.'''
+    if isinstance(date, str):
+        match = ISO_DATE.match(date)
+        if not match:
+            raise ValueError(f'Expected a YYYY-MM-DD date: {date}')
+        return int(match.group(1)) * 10000 + int(match.group(2)) * 100 + int(match.group(3))
+    return date.year * 10000 + date.month * 100 + date.day
+
+
+def is_missing(value):
+    return value is None or (isinstance(value, float) and value != value) or value == ''
+
+
+def iter_items(value):
+    '''The items of a list value, with nested lists (a bullet of <br> separated names) flattened into it.'''
+    for item in value:
+        if isinstance(item, (list, tuple)):
+            yield from iter_items(item)
+        else:
+            yield item
+
+
+def build_index(records, path):
+    '''Write an index of `records`, an iterable of (pageid, title, {field: value}), to `path`.
+    A list value is indexed under each of its items, those of nested lists included. Returns the number of pages indexed.'''
+    pageids = array('q')
+    titles = []
+    terms = {}
+    numbers = []
+    dates = []
+    field_names = {}
+    # values repeat a lot (actors, dates, places), so each distinct one is normalized & scanned once
+    keys = {}
+    for row, (pageid, title, fields) in enumerate(records):
+        pageids.append(int(pageid))
+        titles.append(str(title))
+        for field, value in fields.items():
+            if field not in field_names:
+                field_names[field] = normalize_value(field)
+            field = field_names[field]
+            for item in iter_items(value) if isinstance(value, (list, tuple)) else [value]:
+                parsed = keys.get(item)
+                if parsed is None:
+                    if is_missing(item):
+                        continue
+                    text = str(item)
+                    parsed = keys[item] = (normalize_value(text), number_key(text), date_key(text))
+                value_key, number, date = parsed
+                rows = terms.setdefault((field, value_key), [])
+                # rows only ever grow, so a repeat can only be of the last one
+                if not rows or rows[-1] != row:
+                    rows.append(row)
+                if number is not None:
+                    numbers.append((field, number, row))
+                if date is not None:
+                    dates.append((field, date, row))
+
+    fields = sorted({field for field, _ in terms})
+    field_ids = {field: i for i, field in enumerate(fields)}
+    strings = bytearray()
+    title_offsets = array('q', [0])
+    for title in titles:
+        strings += title.encode()
+        title_offsets.append(len(strings))
+    term_fields = array('q')
+    term_offsets = array('q', [len(strings)])
+    posting_offsets = array('q', [0])
+    postings = array('i')
+    # field ids follow the sorted field names, and UTF-8 bytes sort as their code points do, so this is the
+    # (field id, value bytes) order the index is searched in
+    for field, value in sorted(terms):
+        rows = terms[field, value]
+        term_fields.append(field_ids[field])
+        strings += value.encode()
+        term_offsets.append(len(strings))
+        postings.extend(rows)
+        posting_offsets.append(len(postings))
+    numbers.sort()
+    dates.sort()
+    sections = {'pageids': pageids,
+                'title_offsets': title_offsets,
+                'term_fields': term_fields,
+                'term_offsets': term_offsets,
+                'posting_offsets': posting_offsets,
+                'postings': postings,
+                'number_fields': array('q', (field_ids[x[0]] for x in numbers)),
+                'number_values': array('d', (x[1] for x in numbers)),
+                'number_rows': array('q', (x[2] for x in numbers)),
+                'date_fields': array('q', (field_ids[x[0]] for x in dates)),
+                'date_values': array('q', (x[1] for x in dates)),
+                'date_rows': array('q', (x[2] for x in dates)),
+                'strings': strings,
+                }
+
+    # lay the sections out 8-byte aligned after the header, recording where each one starts
+    layout = {}
+    offset = 0
+    for name, data in sections.items():
+        size = len(data) * (data.itemsize if isinstance(data, array) else 1)
+        layout[name] = [offset, size, data.typecode if isinstance(data, array) else 'B']
+        offset += size + (-size % 8)
+    header = json.dumps({'fields': fields, 'pages': len(titles), 'terms': len(term_fields), 'sections': layout}).encode()
+    header += b' ' * (-len(header) % 8)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(len(header).to_bytes(8, 'little'))
+        f.write(header)
+        for name, data in sections.items():
+            data = data.tobytes() if isinstance(data, array) else bytes(data)
+            f.write(data)
+            f.write(b'\0' * (-len(data) % 8))
+    os.replace(tmp_path, path)
+    return len(titles)
+
+
+def build_index_from_json(json_path, path=None):
+    '''Index a JSON file written by `write_infobox_json` ({title: {field: value}}); the index goes to
+    <json_path minus extension>.idx unless `path` is given. Pages are given pageid 0 if the JSON has none.'''
+    if path is None:
+        path = os.path.splitext(json_path)[0] + '.idx'
+    with open(json_path) as f:
+        data = json.load(f)
+    records = ((fields.pop('pageid', 0), title, fields) for title, fields in data.items())
+    return build_index(records, path)
+
+
+class InfoboxIndex:
+    '''Read-only queries over an index file written by `build_index`, served straight from a memory map.
+    Query results are lists of (pageid, title), in the order the pages were indexed.'''
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:8] != MAGIC:
+            raise ValueError(f'Not an infobox index: {path}')
+        header_size = int.from_bytes(self.map[8:16], 'little')
+        self.header = json.loads(self.map[16:16 + header_size])
+        self.view = memoryview(self.map)
+        base = 16 + header_size
+        for name, (offset, size, typecode) in self.header['sections'].items():
+            setattr(self, name, self.view[base + offset:base + offset + size].cast(typecode))
+        self.fields = self.header['fields']
+        self.field_ids = {field: i for i, field in enumerate(self.fields)}
+
+    def __len__(self):
+        return self.header['pages']
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for name in self.header['sections']:
+            getattr(self, name).release()
+        self.view.release()
+        self.map.close()
+
+    def title(self, row):
+        return bytes(self.strings[self.title_offsets[row]:self.title_offsets[row + 1]]).decode()
+
+    def term(self, i):
+        return self.term_fields[i], bytes(self.strings[self.term_offsets[i]:self.term_offsets[i + 1]])
+
+    def pages(self, rows):
+        return [(self.pageids[row], self.title(row)) for row in sorted(set(rows))]
+
+    def term_rows(self, i):
+        return self.postings[self.posting_offsets[i]:self.posting_offsets[i + 1]].tolist()
+
+    def lookup(self, field, value):
+        '''Pages whose `field` is `value` (or, for list fields, includes it), ignoring case & spacing.'''
+        field_id = self.field_ids.get(normalize_value(field))
+        if field_id is None:
+            return []
+        target = (field_id, normalize_value(value).encode())
+        i = bisect_left(range(self.header['terms']), target, key=self.term)
+        if i < self.header['terms'] and self.term(i) == target:
+            return self.pages(self.term_rows(i))
+        return []
+
+    def prefix(self, field, prefix):
+        '''Pages with a `field` value starting with `prefix`, ignoring case & spacing.'''
+        field_id = self.field_ids.get(normalize_value(field))
+        if field_id is None:
+            return []
+        prefix = normalize_value(prefix).encode()
+        rows = []
+        i = bisect_left(range(self.header['terms']), (field_id, prefix), key=self.term)
+        while i < self.header['terms']:
+            term_field, value = self.term(i)
+            if term_field != field_id or not value.startswith(prefix):
+                break
+            rows.extend(self.term_rows(i))
+            i += 1
+        return self.pages(rows)
+
+    def values(self, field):
+        '''Every normalized value of `field`, with how many pages set it.'''
+        field_id = self.field_ids.get(normalize_value(field))
+        if field_id is None:
+            return {}
+        start = bisect_left(self.term_fields, field_id)
+        end = bisect_right(self.term_fields, field_id)
+        return {self.term(i)[1].decode(): self.posting_offsets[i + 1] - self.posting_offsets[i]
+                for i in range(start, end)}
+
+    def sorted_range(self, fields, values, rows, field, low, high):
+        field_id = self.field_ids.get(normalize_value(field))
+        if field_id is None:
+            return []
+        key = lambda i: (fields[i], values[i])
+        start = bisect_left(range(len(fields)), (field_id, float('-inf') if low is None else low), key=key)
+        end = bisect_right(range(len(fields)), (field_id, float('inf') if high is None else high), key=key)
+        return self.pages(rows[start:end].tolist())
+
+    def range(self, field, low=None, high=None):
+        '''Pages whose `field` holds a number (an episode number or a count) between `low` and `high` inclusive.'''
+        return self.sorted_range(self.number_fields, self.number_values, self.number_rows, field, low, high)
+
+    def date_range(self, field, start=None, end=None):
+        '''Pages whose `field` holds a date between `start` and `end` inclusive (dates or 'YYYY-MM-DD' strings).'''
+        start = None if start is None else as_date_key(start)
+        end = None if end is None else as_date_key(end)
+        return self.sorted_range(self.date_fields, self.date_values, self.date_rows, field, start, end)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='index a JSON file written by write_infobox_json')
+    build.add_argument('json_file')
+    build.add_argument('index', nargs='?')
+    for command in ('lookup', 'prefix'):
+        query = commands.add_parser(command)
+        query.add_argument('index')
+        query.add_argument('field')
+        query.add_argument('value')
+    for command in ('range', 'date_range'):
+        query = commands.add_parser(command)
+        query.add_argument('index')
+        query.add_argument('field')
+        query.add_argument('low')
+        query.add_argument('high')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        print(f'Indexed {build_index_from_json(args.json_file, args.index)} pages')
+        sys.exit()
+    with InfoboxIndex(args.index) as index:
+        if args.command in ('lookup', 'prefix'):
+            results = getattr(index, args.command)(args.field, args.value)
+        elif args.command == 'range':
+            results = index.range(args.field, float(args.low), float(args.high))
+        else:
+            results = index.date_range(args.field, args.low, args.high)
+    for pageid, title in results:
+        print(f'{pageid}\t{title}')
@@ -1,12 +1,34 @@
+import asyncio
+import bisect
+import bz2
+import cProfile
+import csv
+import gzip
 import json
+import os
+import pstats
 import re
+import sqlite3
+import sys
+import threading
 import time
+from array import array
+from collections import OrderedDict, deque
+from collections.abc import Mapping
+from contextlib import contextmanager
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
+from email.utils import parsedate_to_datetime
 from typing import Optional, List
+from urllib.parse import urlencode
 from dataclasses import dataclass, field
 import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
 import pandas as pd
+import xml.etree.ElementTree as ET
 from tqdm.autonotebook import tqdm
+from infobox_index import build_index
 
 # change these variables to change the fandom instance & character category/ies
 FANDOM_SITE = 'coronationstreet'
@@ -55,6 +77,53 @@ NAMESPACES = [
     ('2002', 'Topic'),
     ]
 
+# precompiled wikitext patterns for the infobox tokenizer
+INFOBOX_START = re.compile(r'\{\{\s*(Infobox[^|{}\n]*)')
+TEMPLATE_TOKENS = re.compile(r'\{\{|\}\}|\[\[|\]\]|[|=\n]')
+MARKUP_BRACKETS = re.compile(r'\[\[|\]\]|\{\{|\}\}')
+BRACKETED_TEXT = re.compile(r'([(\[]).*?([)\]])')
+# a one-line `key = value` parameter whose value holds at most simple [[links]] and is followed by the next
+# parameter or the end of the template; these are split without walking their tokens one by one
+SIMPLE_PARAM = re.compile(r'([^|={}\[\]\n]*)=((?:[^|{}\[\]\n]|\[\[[^|{}\[\]\n]*(?:\|[^|{}\[\]\n]*)?\]\])*)\n?(?=\||\}\})')
+LINE_BREAK = re.compile(r'<br(?: />|/>|>)')
+
+# infobox fields given a typed column in columnar (parquet) output
+INTEGER_FIELDS = ['number of appearances']
+DATE_FIELDS = ['born', 'died']
+LIST_FIELDS = ['spouse(s)', 'children', 'sibling(s)']
+ORDINAL_SUFFIX = re.compile(r'(\d+)(?:st|nd|rd|th)\b')
+HTML_COMMENT = re.compile(r'<!--.*?-->', re.DOTALL)
+
+# infobox fields naming related characters, extracted into the relationship graph
+RELATION_FIELDS = ['spouse(s)', 'father', 'mother', 'children', 'sibling(s)']
+PLACEHOLDER_NAMES = {'unknown', 'unnamed', 'none', 'n/a', 'pagename'}
+
+# compound infobox fields split into typed parts by the DataFrame cleaning stage
+EPISODE_FIELDS = ['first appearance', 'last appearance']
+EPISODE_VALUE = re.compile(r'^\s*Episode\s+(\d+)\s*(?:\|\s*(.*?))?\s*$')
+IMAGE_FIELDS = ['image']
+IMAGE_VALUE = re.compile(r'^([^|]*)(?:\|\s*(\d+)\s*px)?')
+
+# wikitext patterns used when reading pages straight from an XML dump
+CATEGORY_LINK = re.compile(r'\[\[\s*Category\s*:\s*([^|\]]+)', re.IGNORECASE)
+SECTION_HEADING = re.compile(r'^==', re.MULTILINE)
+
+# HTTP statuses worth retrying: rate limited, or a transient server/proxy failure
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# queries whose encoded parameters are longer than this are POSTed, keeping long title lists out of the URL
+MAX_QUERY_LENGTH = 2000
+# titles per query for ordinary accounts, and for accounts with the apihighlimits right (e.g. bots)
+TITLES_LIMIT = 50
+TITLES_HIGH_LIMIT = 500
+LIMIT_WARNING = re.compile(r'limit (?:for \S+ )?is (\d+)')
+# responses refusing a batch of titles as too big, which splitting the batch gets round
+SIZE_STATUSES = (413, 414)
+SIZE_ERROR_CODES = ('toomanyvalues',)
+
+# upper bounds (seconds) of the request latency histogram buckets in run reports
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.25, 0.5, 0.75, 1, 2.5, 5, 10, 30, float('inf')]
+
 
 def remove_suffix(cell, suffix):
     if cell and cell.endswith(suffix):
@@ -66,35 +135,1031 @@ def remove_suffix(cell, suffix):
 
 
 def remove_suffixes(df, col_list, suffix_list):
+    """Strip `suffix_list` from the string values of every column in `col_list` (all columns if None), as
+    `remove_suffix` one suffix after another would: in list order, each value losing a suffix then being
+    stripped of whitespace. Each suffix is a vectorized pass over just the values ending in one of them;
+    values that aren't strings (lists, booleans, NaN) are left alone."""
+    if col_list is None:
+        col_list = df.columns
     for col in col_list:
+        values = df[col]
+        if values.dtype != object and not pd.api.types.is_string_dtype(values):
+            continue
+        if values.dtype == object:
+            rows = np.fromiter((isinstance(x, str) for x in values), dtype=bool, count=len(values))
+            strings = pd.Series(values[rows].to_numpy(), dtype=object)
+        else:
+            rows = values.notna().to_numpy(copy=True)
+            strings = values[rows].reset_index(drop=True)
+        candidates = strings.str.endswith(tuple(suffix_list)).to_numpy(dtype=bool)
+        if not candidates.any():
+            continue
+        rows[rows] = candidates
+        strings = strings[candidates]
         for suffix in suffix_list:
-            df[col].loc[df[col].str.endswith(suffix, na=False)] = (df[col].loc[df[col].str.endswith(suffix, na=False)]
-                                                         .apply(lambda x: remove_suffix(x, suffix))
-                                                         .str.strip())
+            ends = strings.str.endswith(suffix)
+            if ends.any():
+                strings = strings.where(~ends, strings.str[:-len(suffix)].str.strip())
+        values = values.copy()
+        values[rows] = strings.to_numpy()
+        df[col] = values
+    return df
+
+
+def parse_infobox_dates(values):
+    """Vectorized parse of infobox date text like '8th March 1950 <!-- comment -->' to datetimes.
+    Values without a four digit year, such as 'c.1987' or '17th February', become NaT."""
+    values = values.astype('string')
+    # dates repeat a lot across a cast, so clean & parse each distinct one once
+    distinct = pd.Series(values.dropna().unique(), dtype='string')
+    text = (distinct.str.replace(HTML_COMMENT, '', regex=True)
+                    .str.replace(ORDINAL_SUFFIX, r'\1', regex=True)
+                    .str.strip())
+    text = text.where(text.str.contains(r'\b\d{4}\b', na=False))
+    # try the usual '8 March 1950' before falling back to guessing the format
+    dates = pd.to_datetime(text, errors='coerce', format='%d %B %Y')
+    unparsed = dates.isna() & text.notna()
+    if unparsed.any():
+        dates[unparsed] = pd.to_datetime(text[unparsed], errors='coerce', dayfirst=True, format='mixed')
+    # reindex rather than map: map gives up on datetimes when there are no dates to map from
+    parsed = pd.Series(dates.to_numpy(), index=distinct.to_numpy(), dtype='datetime64[ns]').reindex(values.to_numpy())
+    return pd.Series(parsed.to_numpy(), index=values.index, name=values.name)
+
+
+def clean_infobox_df(df, suffix_list=None):
+    """Clean an infobox DataFrame in place of per-row string munging: strip `suffix_list` from every column,
+    then split compound fields into typed columns alongside the originals:
+    'Episode 1680 |21st February 1977' appearances into '<field> episode' & '<field> date', and
+    'Image:x.jpg|150px' images into '<field> file' & '<field> size' (in px)."""
+    df = df.copy()
+    if suffix_list:
+        df = remove_suffixes(df, None, suffix_list)
+    for col in EPISODE_FIELDS:
+        if col in df.columns:
+            parts = df[col].astype('string').str.extract(EPISODE_VALUE)
+            df[f'{col} episode'] = pd.to_numeric(parts[0]).astype('Int64')
+            df[f'{col} date'] = parse_infobox_dates(parts[1])
+    for col in IMAGE_FIELDS:
+        if col in df.columns:
+            parts = df[col].astype('string').str.extract(IMAGE_VALUE)
+            df[f'{col} file'] = parts[0].str.strip().replace('', pd.NA)
+            df[f'{col} size'] = pd.to_numeric(parts[1]).astype('Int64')
     return df
 
+
+def as_list(cell):
+    """normalize a multi-valued infobox cell to a list of non-empty strings (None stays missing)"""
+    if isinstance(cell, list):
+        return [str(x) for x in cell if x not in ('', None)]
+    if pd.isna(cell):
+        return None
+    if cell == '':
+        return []
+    return [str(cell)]
+
+
+def type_infobox_df(df, category_ratio=0.5):
+    """Give an infobox DataFrame typed columns for columnar output: integers for INTEGER_FIELDS,
+    datetimes for DATE_FIELDS (unparseable dates such as 'c.1987' become NaT), list columns for
+    LIST_FIELDS, strings elsewhere, and categoricals (dictionary encoded) for strings repeated often enough."""
+    df = df.copy()
+    for col in df.columns:
+        if col in ('pageid', 'page_title'):
+            continue
+        values = df[col]
+        if col in INTEGER_FIELDS:
+            # e.g. '1', or 'Alf Roberts - List of appearances|1775 as of'
+            numbers = values.astype('string').str.rsplit('|', n=1).str[-1].str.extract(r'(\d+)', expand=False)
+            df[col] = pd.to_numeric(numbers).astype('Int64')
+        elif col in DATE_FIELDS:
+            df[col] = parse_infobox_dates(values)
+        elif col in LIST_FIELDS:
+            df[col] = values.map(as_list)
+        else:
+            # the odd <br> separated value in a single-valued field is joined back into one string
+            text = values.map(lambda x: ', '.join(as_list(x)) if isinstance(x, list)
+                              else x if pd.isna(x) else str(x)).astype('string')
+            if text.nunique() < category_ratio * text.notna().sum():
+                text = text.astype('category')
+            df[col] = text
+    return df
+
+
+# These functions are for parsing infobox wikitext.
+
+def process_infobox_value(val):
+    """within the context of an infobox to be parsed, clean up the value after the '=' sign."""
+    val = MARKUP_BRACKETS.sub('', val)
+    if '(' in val or '[' in val:
+        val = BRACKETED_TEXT.sub(r'\g<1>\g<2>', val).replace('()', '')
+    val = val.lstrip('*').strip()
+
+    # if we have a br the value becomes a list
+    if '<br' in val:
+        split_val = LINE_BREAK.split(val)
+        if len(split_val) > 1:
+            return [x.strip() for x in split_val]
+
+    # transform true/false to boolean
+    lowered = val.lower()
+    if lowered == 'true':
+        return True
+    elif lowered == 'false':
+        return False
+    return val
+
+
+def scan_template(text, pos):
+    """Split the body of a template starting at `pos` (just past its name) into top-level parameters.
+    Pipes, equals signs and line breaks inside nested {{templates}} and [[links]] are left alone.
+    Returns a list of (key, value_lines) and the index just past the template's closing braces;
+    value_lines is None for a parameter without an '=' sign."""
+    params = []
+    stack = []
+    start = eq = None
+    breaks = []
+
+    def add_param(end):
+        if start is None:
+            return
+        if eq is None:
+            params.append((text[start:end].split('\n', 1)[0], None))
+        elif not breaks:
+            params.append((text[start:eq], [text[eq + 1:end].replace('\n', ' ')]))
+        else:
+            bounds = [eq + 1] + [b + 1 for b in breaks]
+            ends = breaks + [end]
+            params.append((text[start:eq], [text[a:b].replace('\n', ' ') for a, b in zip(bounds, ends)]))
+
+    while True:
+        m = TEMPLATE_TOKENS.search(text, pos)
+        if m is None:
+            break
+        pos = m.end()
+        token = m[0]
+        if token == '{{' or token == '[[':
+            stack.append(token)
+        elif token == '}}' or token == ']]':
+            opener = '{{' if token == '}}' else '[['
+            if opener in stack:
+                # close the innermost matching construct, along with anything left unclosed inside it
+                while stack.pop() != opener:
+                    pass
+            elif token == '}}':
+                add_param(m.start())
+                return params, m.end()
+        elif stack:
+            continue
+        elif token == '|':
+            add_param(m.start())
+            simple = SIMPLE_PARAM.match(text, pos)
+            if simple:
+                params.append((simple[1], [simple[2]]))
+                start, pos = None, simple.end()
+            else:
+                start, eq, breaks = pos, None, []
+        elif token == '=':
+            if start is not None and eq is None:
+                eq = m.start()
+        elif eq is not None:
+            breaks.append(m.start())
+    # unterminated template: the text ends the template
+    add_param(len(text))
+    return params, len(text)
+
+
+def parse_infobox_text(text, standardize_case=True):
+    """Parse every {{Infobox ...}} template in a page's wikitext into {infobox name: {key: value}}.
+    Values holding a bulleted list ('*' lines) or <br> separated items become lists."""
+    infoboxes = {}
+    pos = 0
+    while True:
+        m = INFOBOX_START.search(text, pos)
+        if m is None:
+            return infoboxes
+        infobox_name = m.group(1).strip().replace('_', ' ')
+        params, pos = scan_template(text, m.end())
+        infobox = infoboxes[infobox_name] = {}
+        for k, lines in params:
+            k = k.strip()
+            if standardize_case:
+                k = k.lower()
+            if lines is None:
+                infobox[k] = ''
+                continue
+            val1 = lines[0].strip()
+            val = process_infobox_value(val1)
+            if type(val) == str and (val1.startswith('*') or not val):
+                # a bulleted list, starting either on the key's line or the line after it
+                items = [val] if val1.startswith('*') else []
+                for line in lines[1:]:
+                    if not line.startswith('*'):
+                        break
+                    items.append(process_infobox_value(line))
+                if items:
+                    val = items
+            infobox[k] = val
+
+
+def parse_infobox_batch(batch, standardize_case=True):
+    """parse a list of (key, wikitext) pairs; the unit of work sent to each parsing process"""
+    return [(k, parse_infobox_text(v, standardize_case)) for k, v in batch]
+
+
+def parse_infoboxes_parallel(raw_infoboxes, standardize_case=True, workers=None, batch_size=None,
+                             batches_per_worker=16):
+    """Parse a {key: wikitext} dict across a pool of `workers` processes (default: one per core),
+    returning {key: parsed infoboxes} in the same order as the serial parser.
+    `python -m benchmarks.bench_scraper --parse-workers 1 2 4 --parse-batches 1 4 16` measures the trade-offs."""
+    items = list(raw_infoboxes.items())
+    workers = workers or os.cpu_count()
+    if batch_size is None:
+        # several batches per worker keeps them all busy & lets results stream back while the rest parse
+        batch_size = max(1, -(-len(items) // (workers * batches_per_worker)))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        batches = executor.map(parse_infobox_batch, make_list_chunks(items, batch_size), repeat(standardize_case))
+        return {k: v for batch in batches for k, v in batch}
+
+
 # These functions are for getting all pages in a category and their infoboxes.
 
+def normalize_title(title):
+    '''A page title as every wiki normalizes it: underscores as spaces & runs of spaces collapsed.
+    Case & namespace prefixes depend on the wiki's settings, so are left for the API to normalize.'''
+    return ' '.join(title.replace('_', ' ').split())
+
+
 def make_list_chunks(lst, n=50):
     """split a list up into sublist chunks of size n (default 50)"""
     return [lst[i:i + n] for i in range(0, len(lst), n)]
 
+
+def index_pages(pages):
+    """map pageid -> title for a list of (pageid, title) tuples, or a {category: [(pageid, title)]} dict"""
+    if isinstance(pages, dict):
+        return {pid: title for category_pages in pages.values() for pid, title in category_pages}
+    return dict(pages)
+
+class TokenBucket:
+    '''A thread-safe token bucket allowing `rate` requests per second, with bursts of up to `capacity`.
+    A `rate` of None or 0 disables rate limiting.'''
+    def __init__(self, rate=1.0, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate or 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        '''Block until a token is available, then consume it. Returns the seconds spent waiting.'''
+        if not self.rate:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class BatchSizer:
+    '''Thread-safe adaptive size for batches of titles, between 1 and `limit`.
+    Grows by a quarter after a full batch whose response was quick & small, and halves after one that was slow
+    (over `target_seconds`), large (over `target_bytes`) or failed. Without `adaptive`, only failures change it.
+    A `pinned` size never changes, so batches fall on the same titles from run to run, as a checkpoint journal
+    keyed by them needs; what a truncated batch leaves over is still fetched in batches of what fitted.'''
+    def __init__(self, limit=TITLES_LIMIT, size=None, target_seconds=2.0, target_bytes=4 * 2**20, adaptive=True,
+                 pinned=False):
+        self.pinned = pinned
+        self.adaptive = adaptive and not pinned
+        self.limit = limit
+        self.size = min(size or limit, limit)
+        self.target_seconds = target_seconds
+        self.target_bytes = target_bytes
+        self.lock = threading.Lock()
+
+    def set_limit(self, limit):
+        if self.pinned:
+            return
+        with self.lock:
+            self.limit = max(1, limit)
+            self.size = min(self.size, self.limit)
+
+    def record(self, n, seconds, nbytes):
+        '''Adjust the size after a batch of `n` titles took `seconds` & returned `nbytes`.'''
+        if not self.adaptive:
+            return
+        with self.lock:
+            if seconds > self.target_seconds or nbytes > self.target_bytes:
+                self.size = max(1, min(self.size, n) // 2)
+            elif n >= self.size and seconds < self.target_seconds / 2 and nbytes < self.target_bytes / 2:
+                self.size = min(self.limit, self.size + max(1, self.size // 4))
+
+    def shrink(self, n):
+        '''Halve the size after a batch of `n` titles failed.'''
+        if self.pinned:
+            return
+        with self.lock:
+            self.size = max(1, min(self.size, n) // 2)
+
+    def fit(self, n):
+        '''Cap the size at `n`, the titles a truncated response had room for, returning the capped size.'''
+        with self.lock:
+            size = max(1, min(self.size, n))
+            if not self.pinned:
+                self.size = size
+            return size
+
+    def batches(self, items, size=None):
+        '''Yield successive batches of `items`, each of `size` or as large as the size is when it's taken.'''
+        start = 0
+        while start < len(items):
+            end = start + (size or self.size)
+            yield items[start:end]
+            start = end
+
+
+class RunMetrics:
+    '''Thread-safe timers, counters & histograms describing a scrape, reported as a JSON-ready dict.
+    With `profile`, stages timed with `timer(name, profile=True)` also run under cProfile.'''
+    def __init__(self, profile=False):
+        self.started = time.time()
+        self.timers = {}
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.profiler = cProfile.Profile() if profile else None
+        self.profiling = False
+
+    def incr(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_time(self, name, seconds):
+        with self.lock:
+            timer = self.timers.setdefault(name, {'seconds': 0.0, 'count': 0})
+            timer['seconds'] += seconds
+            timer['count'] += 1
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS):
+        '''Add `value` to the histogram `name`, counted in the first bucket whose upper bound it doesn't exceed.'''
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = {'buckets': list(buckets), 'counts': [0] * len(buckets),
+                                                     'count': 0, 'sum': 0.0, 'max': 0.0}
+            histogram['counts'][bisect.bisect_left(histogram['buckets'], value)] += 1
+            histogram['count'] += 1
+            histogram['sum'] += value
+            histogram['max'] = max(histogram['max'], value)
+
+    @contextmanager
+    def timer(self, name, profile=False):
+        '''Time the enclosed block as stage `name`, profiling it too if asked and a profiler is set.'''
+        profiling = False
+        if profile and self.profiler is not None:
+            with self.lock:
+                # cProfile only follows the thread that enabled it, and can't be enabled twice
+                if not self.profiling:
+                    try:
+                        self.profiler.enable()
+                        profiling = self.profiling = True
+                    except ValueError:
+                        pass
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+            if profiling:
+                self.profiler.disable()
+                self.profiling = False
+
+    @staticmethod
+    def quantile(histogram, q):
+        '''Upper bound of the bucket holding the `q` quantile of a histogram.'''
+        rank = q * histogram['count']
+        seen = 0
+        for bound, count in zip(histogram['buckets'], histogram['counts']):
+            seen += count
+            if count and seen >= rank:
+                return min(bound, histogram['max'])
+        return histogram['max']
+
+    def report(self, top=25):
+        '''The metrics as a JSON-ready dict; with profiling, includes the `top` functions by own time.'''
+        with self.lock:
+            report = {'started': self.started,
+                      'wall_seconds': time.time() - self.started,
+                      'timers': {k: dict(v) for k, v in self.timers.items()},
+                      'counters': dict(self.counters),
+                      'histograms': {},
+                      }
+            for name, histogram in self.histograms.items():
+                summary = {k: histogram[k] for k in ('count', 'sum', 'max')}
+                summary['mean'] = histogram['sum'] / histogram['count']
+                for q in (0.5, 0.9, 0.99):
+                    summary[f'p{round(q * 100)}'] = self.quantile(histogram, q)
+                summary['buckets'] = [[str(b), c] for b, c in zip(histogram['buckets'], histogram['counts'])]
+                report['histograms'][name] = summary
+        if self.profiler is not None and not self.profiling:
+            try:
+                stats = pstats.Stats(self.profiler).stats
+            except TypeError:  # nothing was profiled
+                stats = {}
+            functions = sorted(stats.items(), key=lambda x: x[1][2], reverse=True)[:top]
+            report['profile'] = [{'function': f'{path}:{line}({name})', 'calls': nc,
+                                  'tottime': tt, 'cumtime': ct}
+                                 for (path, line, name), (cc, nc, tt, ct, callers) in functions]
+        return report
+
+    def write_report(self, path, **extra):
+        '''Write the report, plus any `extra` fields, as JSON; with profiling, the raw pstats go alongside it
+        with a .prof extension.'''
+        report = dict(extra, **self.report())
+        if self.profiler is not None and not self.profiling and report['profile']:
+            self.profiler.dump_stats(os.path.splitext(path)[0] + '.prof')
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=4)
+        return report
+
+
+def retry_after_seconds(response):
+    '''Seconds to wait according to a response's Retry-After header (delta-seconds or HTTP date), or None.'''
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RevisionCache:
+    '''On-disk SQLite store of raw page wikitext keyed by (site, pageid, revid).
+    Only the latest cached revision of each page is kept; once the stored text exceeds `max_bytes`
+    the least recently used pages are evicted.'''
+    def __init__(self, path, max_bytes=512 * 2**20):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS pages (
+                                site TEXT NOT NULL,
+                                pageid INTEGER NOT NULL,
+                                revid INTEGER NOT NULL,
+                                content TEXT NOT NULL,
+                                size INTEGER NOT NULL,
+                                used REAL NOT NULL,
+                                PRIMARY KEY (site, pageid))''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS pages_used ON pages (used)')
+        self.conn.commit()
+
+    def get_many(self, site, revids):
+        '''Given {pageid: revid}, return {pageid: content} for every page cached at exactly that revision.'''
+        found = {}
+        with self.lock:
+            for chunk in make_list_chunks(list(revids), 500):
+                rows = self.conn.execute(
+                    f"SELECT pageid, revid, content FROM pages WHERE site = ? AND pageid IN ({','.join('?' * len(chunk))})",
+                    [site, *chunk])
+                found.update({pageid: content for pageid, revid, content in rows if revids[pageid] == revid})
+            self.conn.executemany('UPDATE pages SET used = ? WHERE site = ? AND pageid = ?',
+                                  [(time.time(), site, pageid) for pageid in found])
+            self.conn.commit()
+            self.hits += len(found)
+            self.misses += len(revids) - len(found)
+        return found
+
+    def put_many(self, site, pages):
+        '''Store an iterable of (pageid, revid, content), replacing older revisions of the same pages.'''
+        now = time.time()
+        with self.lock:
+            self.conn.executemany('INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)',
+                                  [(site, pageid, revid, content, len(content.encode()), now)
+                                   for pageid, revid, content in pages])
+            self.conn.commit()
+        self.evict()
+
+    def evict(self):
+        '''Drop least recently used pages until the cache fits in `max_bytes`.'''
+        with self.lock:
+            total = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM pages').fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            excess = total - self.max_bytes
+            doomed = []
+            for site, pageid, size in self.conn.execute('SELECT site, pageid, size FROM pages ORDER BY used'):
+                if excess <= 0:
+                    break
+                doomed.append((site, pageid))
+                excess -= size
+            self.conn.executemany('DELETE FROM pages WHERE site = ? AND pageid = ?', doomed)
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+class CrawlJournal:
+    '''Append-only JSON Lines journal of a crawl's API responses, keyed by request.
+    Since the responses carry the continuation tokens & fetched payloads, and the category frontier is rebuilt
+    from them, replaying the journal puts a resumed crawl exactly where the interrupted one stopped.
+    Each entry is written as one line and flushed at once, and fsynced at most every `sync_interval` seconds;
+    a line torn by a crash is ignored when the journal is loaded.
+    Only the responses loaded for replay are held in memory, each until it's replayed, so journaling doesn't
+    make a streaming crawl's memory grow with the crawl.'''
+    def __init__(self, path, sync_interval=5.0):
+        self.path = path
+        self.sync_interval = sync_interval
+        self.entries = {}
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            valid_bytes = 0
+            with open(path, 'rb') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break
+                    self.entries[entry['key']] = entry['value']
+                    valid_bytes += len(line)
+            # drop a torn final entry so new entries start on a fresh line
+            os.truncate(path, valid_bytes)
+        if self.entries:
+            print(f'Resuming crawl from {len(self.entries)} journaled requests in {path}')
+        self.file = None
+        self.synced = time.monotonic()
+
+    def replay(self, key, default=None):
+        '''The journaled response for `key` from an earlier run, forgotten once replayed.'''
+        with self.lock:
+            return self.entries.pop(key, default)
+
+    def record(self, key, value):
+        line = json.dumps({'key': key, 'value': value}) + '\n'
+        with self.lock:
+            if self.file is None:
+                self.file = open(self.path, 'a')
+            self.file.write(line)
+            self.file.flush()
+            if time.monotonic() - self.synced >= self.sync_interval:
+                os.fsync(self.file.fileno())
+                self.synced = time.monotonic()
+
+    def clear(self):
+        '''Forget the crawl & delete the journal file.'''
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            self.entries = {}
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+class InfoboxStore(Mapping):
+    '''Columnar store of one infobox template's fields, from which its DataFrame is built without a dict per page.
+    Field names are interned once per store and equal string values are shared. Each field keeps an array of
+    the rows that set it (so presence is sparse) alongside their values.
+    Reads as a mapping of (pageid, title) to that page's {field: value}, like the dicts it replaces.'''
+    def __init__(self):
+        self.pageids = array('q')
+        self.titles = []
+        self.columns = {}  # field: (rows, values)
+        self.strings = {}
+        self.rows = None
+
+    def add(self, pageid, title, fields):
+        row = len(self.titles)
+        self.pageids.append(pageid)
+        self.titles.append(title)
+        for key, value in fields.items():
+            column = self.columns.get(key)
+            if column is None:
+                column = self.columns[sys.intern(key)] = (array('q'), [])
+            if type(value) is str:
+                value = self.strings.setdefault(value, value)
+            column[0].append(row)
+            column[1].append(value)
+        self.rows = None
+
+    def present(self, name):
+        '''Boolean mask of the rows that set the field `name`.'''
+        mask = np.zeros(len(self.titles), dtype=bool)
+        if name in self.columns:
+            mask[np.frombuffer(self.columns[name][0], dtype=np.int64)] = True
+        return mask
+
+    def __len__(self):
+        return len(self.titles)
+
+    def __iter__(self):
+        return zip(self.pageids, self.titles)
+
+    def __getitem__(self, key):
+        if self.rows is None:
+            self.rows = {k: row for row, k in enumerate(self)}
+        row = self.rows[key]
+        fields = {}
+        for name, (rows, values) in self.columns.items():
+            i = bisect.bisect_left(rows, row)
+            if i < len(rows) and rows[i] == row:
+                fields[name] = values[i]
+        return fields
+
+    def to_df(self):
+        '''The DataFrame `build_df_infobox` would make from the equivalent dicts: pageid, page_title, then the
+        fields in the order they were first seen, NaN where a page doesn't set one.
+        Like DataFrame.from_dict(orient='index'), rows are ordered by the first field listing them, and pages
+        that set no fields are left out.'''
+        n = len(self.titles)
+        rows = [np.frombuffer(rows, dtype=np.int64) for rows, values in self.columns.values()]
+        rows = np.concatenate(rows) if rows else np.array([], dtype=np.int64)
+        order = rows[np.sort(np.unique(rows, return_index=True)[1])]
+        data = {'pageid': np.frombuffer(self.pageids, dtype=np.int64)[order].astype(int),
+                'page_title': np.array(self.titles, dtype=object)[order]}
+        for name, (rows, values) in self.columns.items():
+            column = np.full(n, np.nan, dtype=object)
+            column[np.frombuffer(rows, dtype=np.int64)] = np.fromiter(values, dtype=object, count=len(values))
+            data[name] = column[order]
+        df = pd.DataFrame(data, copy=False)
+        # object arrays skip the dtype inference from_dict does, e.g. making an all true/false field bool
+        return df.replace('PAGENAME', np.nan).infer_objects()
+
+
+def normalize_name(name):
+    """case & whitespace insensitive form of a character name or page title"""
+    return ' '.join(name.replace('_', ' ').split()).casefold()
+
+
+def relation_names(value):
+    """The character names in a relation field value, e.g. ['Bessie Tatlock|Bessie Vickery', 'Bet Lynch']
+    gives ['Bessie Tatlock', 'Bet Lynch'] (a link's target, not its display text)."""
+    if isinstance(value, list):
+        return [name for item in value for name in relation_names(item)]
+    if not isinstance(value, str):
+        return []
+    names = []
+    for line in LINE_BREAK.split(value):
+        for piece in line.split(','):
+            name = piece.split('|', 1)[0].strip()
+            if name and name.casefold() not in PLACEHOLDER_NAMES:
+                names.append(name)
+    return names
+
+
+class RelationGraph:
+    '''Relationships between characters taken from the RELATION_FIELDS of their infoboxes.
+    Names are resolved to pages by title, then by unambiguous 'character name', then by title without its
+    (qualifier). Resolved edges are held as CSR arrays: the edges out of page i are
+    indices[indptr[i]:indptr[i + 1]], with their relation codes in edge_relations.'''
+    def __init__(self, records, fields=None):
+        '''`records` is an iterable of (pageid, page title, {field: value}).'''
+        self.relations = list(fields or RELATION_FIELDS)
+        self.pageids = []
+        self.titles = []
+        raw_edges = []
+        for pageid, title, infobox in records:
+            node = len(self.titles)
+            self.pageids.append(pageid)
+            self.titles.append(title)
+            for code, relation in enumerate(self.relations):
+                raw_edges.extend((node, code, name) for name in relation_names(infobox.get(relation)))
+            if infobox.get('character name'):
+                raw_edges.append((node, -1, infobox['character name']))
+
+        # index names, dropping any shared by several pages
+        by_title = {normalize_name(title): node for node, title in enumerate(self.titles)}
+        by_name = {}
+        for node, code, name in raw_edges:
+            if code == -1:
+                key = normalize_name(name)
+                by_name[key] = None if by_name.get(key, node) != node else node
+        for node, title in enumerate(self.titles):
+            key = normalize_name(re.sub(r'\s*\(.*\)$', '', title))
+            if key not in by_name:
+                by_name[key] = node
+            elif by_name[key] != node:
+                by_name[key] = None
+        self.name_index = {k: v for k, v in by_name.items() if v is not None}
+        self.name_index.update(by_title)
+
+        # (source node, relation code, name as written, target node or -1)
+        self.edges = [(node, code, name, self.name_index.get(normalize_name(name), -1))
+                      for node, code, name in raw_edges if code != -1]
+        n = len(self.titles)
+        edges = np.array([(src, code, dst) for src, code, _, dst in self.edges if dst >= 0],
+                         dtype=np.int32).reshape(-1, 3)
+        self.indptr, self.indices, self.edge_relations = self.build_csr(edges[:, 0], edges[:, 2], edges[:, 1], n)
+        # relations read both ways for path queries: a parent's child is also the child's parent
+        both_src = np.concatenate([edges[:, 0], edges[:, 2]])
+        both_dst = np.concatenate([edges[:, 2], edges[:, 0]])
+        self.undirected_indptr, self.undirected_indices, _ = self.build_csr(both_src, both_dst, both_src, n)
+
+    @staticmethod
+    def build_csr(src, dst, data, n):
+        order = np.argsort(src, kind='stable')
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+        return indptr, dst[order], data[order].astype(np.int8)
+
+    @classmethod
+    def from_df(cls, df, fields=None):
+        '''Build the graph from an infobox DataFrame (as made by `WikiInfobox.build_df_infobox`).'''
+        fields = fields or RELATION_FIELDS
+        columns = [c for c in fields + ['character name'] if c in df.columns]
+        infoboxes = df[columns].replace({np.nan: None}).to_dict('records')
+        return cls(zip(df.pageid.tolist(), df.page_title.tolist(), infoboxes), fields)
+
+    @classmethod
+    def from_json(cls, path, fields=None):
+        '''Build the graph from a json file written by `WikiInfobox.write_infobox_json`.'''
+        with open(path) as f:
+            data = json.load(f)
+        return cls(((v.get('pageid'), k, v) for k, v in data.items()), fields)
+
+    def node(self, name):
+        '''The node of the page a title or character name resolves to.'''
+        return self.name_index[normalize_name(name)]
+
+    def neighbours(self, name, relation=None):
+        '''[(page title, relation)] for the pages `name`'s infobox links to, optionally for one relation only.'''
+        node = self.node(name)
+        start, end = self.indptr[node], self.indptr[node + 1]
+        found = [(self.titles[dst], self.relations[code])
+                 for dst, code in zip(self.indices[start:end], self.edge_relations[start:end])]
+        if relation is not None:
+            found = [x for x in found if x[1] == relation]
+        return found
+
+    def shortest_path(self, source, target):
+        '''The page titles on a shortest chain of relations (in either direction) from source to target,
+        or None if they aren't connected.'''
+        start, goal = self.node(source), self.node(target)
+        parents = np.full(len(self.titles), -1, dtype=np.int64)
+        parents[start] = start
+        queue = deque([start])
+        while queue:
+            node = queue.popleft()
+            if node == goal:
+                path = [node]
+                while path[-1] != start:
+                    path.append(parents[path[-1]])
+                return [self.titles[x] for x in reversed(path)]
+            for dst in self.undirected_indices[self.undirected_indptr[node]:self.undirected_indptr[node + 1]]:
+                if parents[dst] < 0:
+                    parents[dst] = node
+                    queue.append(dst)
+        return None
+
+    def iter_edges(self, relation=None):
+        '''Yield (source pageid, source title, relation, name as written, target pageid, target title);
+        the target is None where the name couldn't be resolved to a page.'''
+        for src, code, name, dst in self.edges:
+            if relation is not None and self.relations[code] != relation:
+                continue
+            resolved = dst >= 0
+            yield (self.pageids[src], self.titles[src], self.relations[code], name,
+                   self.pageids[dst] if resolved else None, self.titles[dst] if resolved else None)
+
+    def write_edges(self, path, relation=None):
+        '''Stream the edge list to a csv file.'''
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['source_pageid', 'source_title', 'relation', 'target_name', 'target_pageid', 'target_title'])
+            writer.writerows(self.iter_edges(relation))
+
+
+def normalize_category(name):
+    """a category name as MediaWiki compares them: underscores as spaces, first letter upper case"""
+    name = ' '.join(name.replace('_', ' ').split())
+    return name[:1].upper() + name[1:]
+
+
+def iter_dump_pages(path, namespaces=(0,)):
+    """Stream (pageid, title, namespace, wikitext) for the current revision of each page in `namespaces`
+    from a MediaWiki XML dump (optionally .bz2 or .gz compressed), discarding each page once it's read
+    so memory use doesn't grow with the size of the dump."""
+    if path.endswith('.bz2'):
+        f = bz2.open(path, 'rb')
+    elif path.endswith('.gz'):
+        f = gzip.open(path, 'rb')
+    else:
+        f = open(path, 'rb')
+    namespaces = {int(x) for x in namespaces}
+    with f:
+        root = None
+        for event, elem in ET.iterparse(f, events=('start', 'end')):
+            if root is None:
+                root = elem
+            # tags are namespaced, e.g. '{http://www.mediawiki.org/xml/export-0.11/}page'
+            if event != 'end' or elem.tag.rsplit('}', 1)[-1] != 'page':
+                continue
+            xmlns = elem.tag[:-len('page')]
+            ns = int(elem.findtext(f'{xmlns}ns', '0'))
+            if ns in namespaces:
+                yield (int(elem.findtext(f'{xmlns}id')),
+                       elem.findtext(f'{xmlns}title'),
+                       ns,
+                       elem.findtext(f'{xmlns}revision/{xmlns}text') or '')
+            root.clear()
+
+
+def dump_subcategories(path, categories):
+    """One pass over a dump's category pages to find every category below `categories` (which are included)."""
+    children = {}
+    for pageid, title, ns, text in iter_dump_pages(path, namespaces=(14,)):
+        name = normalize_category(title.split(':', 1)[-1])
+        for parent in CATEGORY_LINK.findall(text):
+            children.setdefault(normalize_category(parent), []).append(name)
+    found = {normalize_category(c) for c in categories}
+    frontier = list(found)
+    while frontier:
+        frontier = [c for parent in frontier for c in children.get(parent, []) if c not in found]
+        found.update(frontier)
+    return found
+
+
+def infobox_record(pageid, infobox):
+    """one page's infobox fields as written to the json output, dropping PAGENAME placeholders like the DataFrames do"""
+    record = {'pageid': pageid}
+    record.update({k: None if v == 'PAGENAME' else v for k, v in infobox.items()})
+    return record
+
+
+def infobox_index_records(df):
+    '''(pageid, title, {field: value}) for each row of an infobox DataFrame, as `build_index` takes them.'''
+    fields = [c for c in df.columns if c not in ('pageid', 'page_title')]
+    columns = [df[c].tolist() for c in fields]
+    for pageid, title, *values in zip(df['pageid'].tolist(), df['page_title'].tolist(), *columns):
+        yield pageid, title, dict(zip(fields, values))
+
+
+def write_infoboxes_jsonl(parsed_infoboxes, path):
+    """Incrementally write ((pageid, title), {infobox name: infobox}) pairs as JSON Lines, one line per infobox."""
+    with open(path, 'w') as f:
+        for (pageid, title), infoboxes in parsed_infoboxes:
+            for infobox_name, infobox in infoboxes.items():
+                line = {'page_title': title, 'infobox': infobox_name}
+                line.update(infobox_record(pageid, infobox))
+                f.write(json.dumps(line) + '\n')
+
+
+def write_infoboxes_json_stream(parsed_infoboxes, path, template=None):
+    """Incrementally write one infobox template (default: the first one seen) from ((pageid, title),
+    {infobox name: infobox}) pairs as a JSON object keyed by page title."""
+    with open(path, 'w') as f:
+        f.write('{')
+        separator = '\n'
+        for (pageid, title), infoboxes in parsed_infoboxes:
+            if template is None and infoboxes:
+                template = next(iter(infoboxes))
+            if template not in infoboxes:
+                continue
+            record = json.dumps(infobox_record(pageid, infoboxes[template]), indent=4).replace('\n', '\n    ')
+            f.write(f'{separator}    {json.dumps(title)}: {record}')
+            separator = ',\n'
+        f.write('\n}')
+
+
 @dataclass
 class WikiAPI:
     '''A base class for querying a fandom Wiki'''
     fandom_site: str = FANDOM_SITE
-    fandom_url: str = FANDOM_URL
-    api_url: str = API_URL
+    fandom_url: Optional[str] = None  # defaults to https://<fandom_site>.fandom.com
+    api_url: Optional[str] = None  # defaults to <fandom_url>/api.php
+    json_file: Optional[str] = None  # defaults to projects/<fandom_site>.json
     category: Optional[str] = CATEGORY
     categories: Optional[list] = field(default_factory=list)
     namespaces: List = field(default_factory=list)
     params: dict = field(default_factory=dict)
+    rate_limit: Optional[float] = 1.0  # requests per second shared by all workers
+    max_concurrency: int = 4  # requests in flight at once
+    max_retries: int = 5
+    backoff_factor: float = 1.0  # seconds; doubles on every retry
+    maxlag: Optional[int] = 5  # ask the server to refuse requests while replication lag exceeds this
+    timeout: float = 30
+    checkpoint_file: Optional[str] = None  # journal of fetched queries so an interrupted crawl can resume
+    profile: bool = False  # run the CPU-bound stages under cProfile, adding the hottest functions to the run report
+    write_report: bool = True  # write a JSON run report of the metrics next to each output file
+    batch_size: Optional[int] = None  # titles per query; None sizes batches adaptively up to the account's limit
 
     def __post_init__(self):
+        if self.fandom_url is None:
+            self.fandom_url = f'https://{self.fandom_site}.fandom.com'
+        if self.api_url is None:
+            self.api_url = self.fandom_url + '/api.php'
+        if self.json_file is None:
+            self.json_file = self.site_path('.json')
         self.namespaces = NAMESPACES
         self.params = {'action': 'query',
                        'format': 'json',
                       }
+        self.rate_limiter = TokenBucket(self.rate_limit)
+        # one pooled keep-alive session per instance, shared by every request it makes
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=max(10, self.max_concurrency))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({'Accept-Encoding': 'gzip, deflate'})
+        self.metrics = RunMetrics(profile=self.profile)
+        self.batch_sizer = None
+        # latency & size of the last response on each thread, for batch sizing
+        self.last_response = threading.local()
+        self.journal = CrawlJournal(self.checkpoint_file) if self.checkpoint_file else None
+
+    def site_path(self, suffix):
+        '''Path of a per-site output file under projects/, e.g. site_path('.json').'''
+        return f"projects/{self.fandom_site}{suffix}"
+
+    def share_transport(self, other):
+        '''Use another instance's session, rate limit, retry settings, metrics & checkpoint journal, so both count
+        against the same budget & handle failures alike.'''
+        self.session = other.session
+        self.maxlag = other.maxlag
+        self.max_retries = other.max_retries
+        self.backoff_factor = other.backoff_factor
+        self.timeout = other.timeout
+        self.rate_limiter = other.rate_limiter
+        self.metrics = other.metrics
+        self.journal = other.journal
+
+    def get_json(self, url, params=None):
+        '''GET an API query's JSON. With a checkpoint journal, a query an interrupted run already made is
+        replayed from the journal instead of being fetched again.'''
+        if self.journal is None:
+            return self.get(url, params=params).json()
+        key = json.dumps([url, params], sort_keys=True, default=str)
+        data = self.journal.replay(key)
+        if data is None:
+            data = self.get(url, params=params).json()
+            self.journal.record(key, data)
+        else:
+            self.metrics.incr('journal replays')
+        return data
+
+    def get(self, url, params=None):
+        '''GET `url` on the pooled session under the rate limit, or POST it when the query string would be long.
+        Connection errors, 429/5xx responses and maxlag errors are retried with exponential backoff,
+        waiting at least as long as any Retry-After header asks.'''
+        params = dict(params or {})
+        if self.maxlag is not None and params.get('action') != 'raw':
+            params.setdefault('maxlag', self.maxlag)
+        for attempt in range(self.max_retries + 1):
+            waited = self.rate_limiter.acquire()
+            if waited:
+                self.metrics.add_time('rate limit wait', waited)
+            response = None
+            start = time.perf_counter()
+            try:
+                if len(urlencode(params)) > MAX_QUERY_LENGTH:
+                    response = self.session.post(url, data=params, timeout=self.timeout)
+                    self.metrics.incr('post requests')
+                else:
+                    response = self.session.get(url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+            latency = time.perf_counter() - start
+            is_maxlag = response is not None and response.headers.get('MediaWiki-API-Error') == 'maxlag'
+            self.metrics.incr('requests')
+            self.metrics.observe('request latency', latency)
+            if attempt:
+                self.metrics.incr('retries')
+            if is_maxlag:
+                self.metrics.incr('maxlag')
+            if response is not None:
+                self.metrics.incr('bytes', len(response.content))
+                self.last_response.latency = latency
+                self.last_response.size = len(response.content)
+            else:
+                self.metrics.incr('connection errors')
+            if response is not None:
+                if is_maxlag:
+                    if attempt == self.max_retries:
+                        raise requests.HTTPError(f'Server lagged after {attempt + 1} attempts: {response.url}',
+                                                 response=response)
+                elif response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    response.raise_for_status()
+                    return response
+            wait = self.backoff_factor * 2 ** attempt
+            if response is not None:
+                wait = max(wait, retry_after_seconds(response) or 0)
+            self.metrics.add_time('backoff sleep', wait)
+            time.sleep(wait)
 
     def scrape(self):
         pass
@@ -103,16 +1168,140 @@ class WikiAPI:
         pass
 
     def build(self):
-        self.scrape()
-        self.parse()
+        with self.metrics.timer('scrape'):
+            self.scrape()
+        with self.metrics.timer('parse'):
+            self.parse()
+        self.finish_crawl()
 
-    def get_all_namespaces(self, api_url=API_URL):
+    def finish_crawl(self):
+        '''Delete the checkpoint journal once a crawl has finished, so the next run fetches afresh.'''
+        if self.journal is not None:
+            self.journal.clear()
+
+    def write_run_report(self, output_path):
+        '''Write the run's metrics to <output_path minus extension>.report.json, if `write_report` is set.
+        Metrics accumulate over the whole run, so the latest report covers every stage so far.'''
+        if not self.write_report:
+            return None
+        path = os.path.splitext(output_path)[0] + '.report.json'
+        self.metrics.write_report(path, site=self.fandom_site, output=output_path)
+        return path
+
+    def get_batch_sizer(self):
+        '''The sizer for batches of titles, made on first use. Its limit is 500 titles if the account has the
+        apihighlimits right and 50 otherwise; a fixed `batch_size` pins the size instead.
+        With a checkpoint journal the size is pinned too, since the journal is keyed by the titles requested:
+        batches that depended on how fast the server answered wouldn't be found again on resuming.'''
+        if self.batch_sizer is None:
+            if self.batch_size:
+                self.batch_sizer = BatchSizer(self.batch_size, pinned=True)
+            else:
+                data = self.get_json(self.api_url, params={'action': 'query',
+                                                           'format': 'json',
+                                                           'meta': 'userinfo',
+                                                           'uiprop': 'rights',
+                                                           })
+                rights = data.get('query', {}).get('userinfo', {}).get('rights', [])
+                limit = TITLES_HIGH_LIMIT if 'apihighlimits' in rights else TITLES_LIMIT
+                # a pinned size starts (& stays) at the limit, leaving truncated responses to size what's left
+                self.batch_sizer = BatchSizer(limit, size=limit if self.journal is not None else TITLES_LIMIT,
+                                              pinned=self.journal is not None)
+        return self.batch_sizer
+
+    def fetch_title_batch(self, titles, params, required=None, normalized=None):
+        '''Query `params` for a batch of titles, returning {pageid: page} for the pages found.
+        A batch refused as too big (a 413/414 or a too-many-values error), or whose response leaves pages out
+        (or, given `required`, without that key), is split and the rest fetched again; a single title that
+        still won't fit is reported and skipped. Other failures have already been retried by `get`, so they
+        are raised rather than split into yet more failing requests.
+        If `normalized` is given it is filled with {title requested: title as the API normalized or converted it}.'''
+        sizer = self.get_batch_sizer()
+        self.last_response.latency = self.last_response.size = None
+        try:
+            data = self.get_json(self.api_url, params=dict(params, titles='|'.join(titles)))
+        except requests.HTTPError as error:
+            if error.response is None or error.response.status_code not in SIZE_STATUSES:
+                raise
+            self.metrics.incr('failed batches')
+            return self.split_title_batch(titles, params, required, error, normalized)
+        if 'error' in data:
+            error = f"{data['error'].get('code')}: {data['error'].get('info')}"
+            if data['error'].get('code') not in SIZE_ERROR_CODES:
+                raise requests.HTTPError(error)
+            self.metrics.incr('failed batches')
+            return self.split_title_batch(titles, params, required, error, normalized)
+        if self.last_response.latency is not None:
+            sizer.record(len(titles), self.last_response.latency, self.last_response.size)
+        for warning in data.get('warnings', {}).values():
+            limit = LIMIT_WARNING.search(str(warning.get('*', warning)))
+            if limit:
+                sizer.set_limit(int(limit.group(1)))
+        query = data.get('query', {})
+        pages = query.get('pages', {})
+        returned = {v['title'] for v in pages.values()}
+        mappings = query.get('normalized', []) + query.get('converted', [])
+        if normalized is not None:
+            normalized.update((mapping['from'], mapping['to']) for mapping in mappings)
+        for mapping in mappings:
+            if mapping['to'] in returned:
+                returned.add(mapping['from'])
+        incomplete = {v['title'] for k, v in pages.items() if int(k) > 0 and required and required not in v}
+        pages = {k: v for k, v in pages.items() if v['title'] not in incomplete}
+        left_over = [t for t in titles if t not in returned or t in incomplete]
+        if left_over:
+            # the server truncated the batch (a titles limit or the response size limit): fetch the rest smaller
+            self.metrics.incr('split batches')
+            if len(left_over) < len(titles):
+                for batch in sizer.batches(left_over, sizer.fit(len(titles) - len(left_over))):
+                    pages.update(self.fetch_title_batch(batch, params, required, normalized))
+            else:
+                pages.update(self.split_title_batch(titles, params, required, 'the response left it out', normalized))
+        return pages
+
+    def split_title_batch(self, titles, params, required, error, normalized=None):
+        '''Fetch a batch of titles that didn't fit in one response as two halves; a single title is skipped.'''
+        if len(titles) == 1:
+            self.metrics.incr('failed titles')
+            print(f'Could not fetch {titles[0]}: {error}')
+            return {}
+        self.get_batch_sizer().shrink(len(titles))
+        half = len(titles) // 2
+        pages = self.fetch_title_batch(titles[:half], params, required, normalized)
+        pages.update(self.fetch_title_batch(titles[half:], params, required, normalized))
+        return pages
+
+    def fetch_title_batches(self, titles, params, required=None, progress=True):
+        '''Yield {pageid: page} for adaptively sized batches of `titles`, fetched concurrently.'''
+        sizer = self.get_batch_sizer()
+        with tqdm(total=len(titles), disable=not progress) as bar:
+            for pages in self.concurrent_map(lambda batch: (len(batch), self.fetch_title_batch(batch, params, required)),
+                                             sizer.batches(titles)):
+                bar.update(pages[0])
+                yield pages[1]
+
+    def concurrent_map(self, func, items):
+        '''Apply `func` to each item on a bounded thread pool, yielding results in input order.
+        Only a small window of calls is submitted ahead of the consumer, so a slow consumer bounds memory.'''
+        window = 2 * self.max_concurrency
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            pending = deque()
+            for item in items:
+                pending.append(executor.submit(func, item))
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def get_all_namespaces(self, api_url=None):
+        if api_url is None:
+            api_url = self.api_url
         params = {'action': 'query',
                   'format': 'json',
                   'meta': 'siteinfo',
                   'siprop': 'namespaces',
                   }
-        r = requests.get(api_url, params=params)
+        r = self.get(api_url, params=params)
         data = json.loads(r.text)
         namespaces = data['query']['namespaces']
         nses = [(k, v.get('canonical', '*')) for k, v in namespaces.items()]
@@ -133,8 +1322,7 @@ class WikiAPI:
         all_pages = []
         cont = "0"
         while cont != "1":
-            r = requests.get(API_URL, params=params)
-            data = json.loads(r.text)
+            data = self.get_json(self.api_url, params=params)
             pages = data['query']['allpages']
             pages = [(x['pageid'], x['title']) for x in pages]
             all_pages.extend(pages)
@@ -144,7 +1332,6 @@ class WikiAPI:
                 apcontinue = "1"
             cont = apcontinue
             params.update({'apcontinue': apcontinue})
-            time.sleep(1)
         return all_pages
 
 
@@ -154,9 +1341,12 @@ class WikiCategory(WikiAPI):
     Queries the API for both categories & pages at the same time.'''
     recursive: bool = True
     group_pages: bool = False
+    max_depth: Optional[int] = None  # levels of subcategories to descend; None for no limit
+    use_generator: bool = False  # list members via generator=categorymembers, collecting page info too
 
     def __post_init__(self):
         super().__post_init__()
+        self.page_info = {}
         self.params.update({'list': 'categorymembers',
                             'cmtype': 'subcat|page',
                             'cmtitle': f'Category:{self.category}',
@@ -170,11 +1360,15 @@ class WikiCategory(WikiAPI):
         self.category_members = self.get_category_members()
         self.subcats = self.category_members.get('subcats', None)
         self.pages = self.category_members.get('pages', None)
+        # index pages once so matching infoboxes to titles is a lookup rather than a scan
+        self.page_index = index_pages(self.pages)
         if not self.group_pages:
             self.pageids = [x[0] for x in self.pages]
             self.titles = sorted([x[1] for x in self.pages])
 
-    def get_category_members(self, categories=None, recursive=None, group_pages=None, params=None):
+    def get_category_members(self, categories=None, recursive=None, group_pages=None, params=None, max_depth=None):
+        '''Crawl the categories breadth first, fetching each level's categories concurrently under the shared
+        rate limit. Every category is fetched once, however many parents it has, so cycles can't loop forever.'''
         if categories is None:
             categories = self.categories
         if recursive is None:
@@ -183,8 +1377,10 @@ class WikiCategory(WikiAPI):
             group_pages = self.group_pages
         if params is None:
             params = self.params
+        if max_depth is None:
+            max_depth = self.max_depth
         items = {}
-        items['categories'] = categories
+        items['categories'] = []
         items['subcats'] = []
         if group_pages:
             items['pages'] = {}
@@ -192,37 +1388,69 @@ class WikiCategory(WikiAPI):
             items['pages'] = []
 
         print('Retrieving category members:\n')
-        for category in tqdm(items['categories']):
-            params['cmtitle'] = f'Category:{category}'
-            params['cmcontinue'] = 0
-            while params['cmcontinue'] != 1:
-                r = requests.get(API_URL, params=params)
-                # print(r.url)
-                data = json.loads(r.text)
-                results = data['query']['categorymembers']
-                subcats = [x['title'].replace('Category:', '') for x in results if int(x['ns']) == 14]
+        visited = set()
+        frontier = list(dict.fromkeys(categories))
+        depth = 0
+        while frontier:
+            visited.update(frontier)
+            items['categories'].extend(frontier)
+            next_frontier = []
+            results = self.concurrent_map(lambda category: self.fetch_category_members(category, params), frontier)
+            for category, (subcats, pages, page_info) in zip(frontier, tqdm(results, total=len(frontier))):
                 items['subcats'].extend(subcats)
-                pages = [(x['pageid'], x['title']) for x in results if int(x['ns']) == 0]
+                self.page_info.update(page_info)
                 if group_pages:
-                    if not items['pages'].get(category, None):
-                        items['pages'][category] = []
-                    items['pages'][category].extend(pages)
+                    items['pages'].setdefault(category, []).extend(pages)
                 else:
                     items['pages'].extend(pages)
-                if recursive:
-                    # append new categories to the category list
-                    items['categories'].extend(subcats)
-                if 'batchcomplete' in data.keys():
-                    params['cmcontinue'] = 1
-                else:
-                    params['cmcontinue'] = data['continue']['cmcontinue']
-            time.sleep(1)
+                if recursive and (max_depth is None or depth < max_depth):
+                    for subcat in subcats:
+                        if subcat not in visited:
+                            visited.add(subcat)
+                            next_frontier.append(subcat)
+            frontier = next_frontier
+            depth += 1
         # prune duplicates (pages likely to re-occur across multiple subcategories)
         if not group_pages:
             for k, v in items.items():
                 items[k] = sorted(list(set(v)))
         return items
 
+    def fetch_category_members(self, category, params=None):
+        '''Page through the members of a single category, returning (subcategory names, [(pageid, title)], page info).
+        With `use_generator`, pages come from generator=categorymembers along with their prop=info metadata
+        ({pageid: info}); otherwise the page info is empty.'''
+        if params is None:
+            params = self.params
+        params = {k: v for k, v in params.items() if k != 'cmcontinue'}
+        if self.use_generator:
+            for k in ('list', 'cmtype', 'cmtitle', 'cmlimit'):
+                params.pop(k, None)
+            params.update({'generator': 'categorymembers',
+                           'gcmtitle': f'Category:{category}',
+                           'gcmtype': 'subcat|page',
+                           'gcmlimit': 500,
+                           'prop': 'info',
+                           })
+        else:
+            params['cmtitle'] = f'Category:{category}'
+        subcats = []
+        pages = []
+        page_info = {}
+        while True:
+            data = self.get_json(self.api_url, params=params)
+            if self.use_generator:
+                results = list(data.get('query', {}).get('pages', {}).values())
+                page_info.update({x['pageid']: x for x in results if int(x['ns']) == 0})
+            else:
+                results = data['query']['categorymembers']
+            subcats.extend(x['title'].replace('Category:', '') for x in results if int(x['ns']) == 14)
+            pages.extend((x['pageid'], x['title']) for x in results if int(x['ns']) == 0)
+            if 'continue' not in data:
+                break
+            params.update(data['continue'])
+        return subcats, pages, page_info
+
 
 @dataclass
 class WikiInfobox(WikiAPI):
@@ -233,45 +1461,193 @@ class WikiInfobox(WikiAPI):
     by_category: bool = True
     standardize_case: bool = True
     alert_empty: bool = True
+    cache_file: Optional[str] = None  # sqlite file for incremental re-scrapes; None disables caching
+    cache_max_bytes: int = 512 * 2**20
+    clean_dfs: bool = False  # run the DataFrame cleaning stage (suffixes & compound field splitting)
+    clean_suffixes: Optional[list] = field(default_factory=list)
+    dump_file: Optional[str] = None  # read pages from this XML dump instead of the API
+    dump_namespaces: List = field(default_factory=lambda: [0])
+    parse_workers: int = 1  # processes used to parse infoboxes; 0 or None for one per core
+    # below this many pages parsing stays serial: the pool costs ~26 ms to start, and unpickling results in the
+    # parent ~6 us of each page's ~20 us, so a pool pays off from ~8k pages on 2 cores, ~3k on 4 & ~2.3k on 8
+    parallel_parse_threshold: int = 5000
+    use_generator: bool = False  # list pages & fetch their section 0 together, via generator queries
+    # collect parsed infoboxes in columnar InfoboxStores rather than dicts per page; the per-page dicts
+    # (`unsorted_infoboxes`) are then never built, so that attribute is only set with compact_records=False
+    compact_records: bool = True
+    write_index: bool = True  # write a field index (see infobox_index.py) next to the JSON output
 
     def __post_init__(self):
         super().__post_init__()
         self.params.update({
             'prop': 'revisions',
-            'rvprop': 'content',
+            'rvprop': 'ids|content',
             'rvsection': '0',
             'rvslots': '*',
         })
+        self.cache = RevisionCache(self.cache_file, self.cache_max_bytes) if self.cache_file else None
         if self.pages and not self.titles:
             self.titles = [x[1] for x in self.pages]
 
     def scrape(self):
+        if self.dump_file:
+            self.scrape_dump()
+            return
+        if self.use_generator and not self.pages and not self.titles:
+            with self.metrics.timer('generate infoboxes'):
+                self.scrape_generator()
+            return
+        with self.metrics.timer('list pages'):
+            self.get_page_list()
+        if self.titles:
+            self.params.update({'titles': self.titles})
+            with self.metrics.timer('fetch infoboxes'):
+                self.raw_infoboxes = self.get_raw_infoboxes()
+            self.matched_raw_infoboxes = self.match_names_to_infoboxes()
+
+    def get_page_list(self):
+        '''Fill in pages, pageids, titles & page_index, listing the categories if no pages were given.'''
         if self.by_category:
             if not self.categories:
                 self.categories = [self.category]
             if not self.pages and not self.titles:
-                wikicat = WikiCategory(categories=self.categories, recursive=self.recursive)
+                wikicat = WikiCategory(fandom_site=self.fandom_site, fandom_url=self.fandom_url,
+                                       api_url=self.api_url, categories=self.categories,
+                                       recursive=self.recursive, max_concurrency=self.max_concurrency)
+                wikicat.share_transport(self)
                 wikicat.scrape()
                 self.pages = wikicat.pages
                 self.pageids = wikicat.pageids
                 self.titles = wikicat.titles
+                self.page_index = wikicat.page_index
             elif not self.titles:
                 self.pageids = [x[0] for x in self.pages]
                 self.titles = [x[1] for x in self.pages]
-        if self.titles:
-            self.params.update({'titles': self.titles})
-            self.raw_infoboxes = self.get_raw_infoboxes()
-            self.matched_raw_infoboxes = self.match_names_to_infoboxes()
+                self.page_index = index_pages(self.pages)
 
     def parse(self):
-        if self.titles:
-            self.unsorted_infoboxes = self.get_parsed_infoboxes()
-            self.infoboxes = self.sort_infoboxes_by_template()
-            self.dfs = self.build_dfs_infobox()
+        if self.titles and self.compact_records:
+            with self.metrics.timer('parse infoboxes', profile=True):
+                self.infoboxes = self.get_infobox_stores()
+            with self.metrics.timer('build dataframes', profile=True):
+                self.dfs = self.build_dfs_infobox()
+            if len(self.dfs) == 1:
+                self.df = list(self.dfs.values())[0]
+        elif self.titles:
+            with self.metrics.timer('parse infoboxes', profile=True):
+                self.unsorted_infoboxes = self.get_parsed_infoboxes()
+            with self.metrics.timer('sort infoboxes', profile=True):
+                self.infoboxes = self.sort_infoboxes_by_template()
+            with self.metrics.timer('build dataframes', profile=True):
+                self.dfs = self.build_dfs_infobox()
             if len(self.dfs) == 1:
                 self.df = list(self.dfs.values())[0]
 
-    def get_raw_infoboxes(self, titles=None, params=None):
+    def iter_dump_infoboxes(self, path=None):
+        '''Yield (pageid, title, section-0 wikitext) for the pages of an XML dump in `dump_namespaces` and,
+        when scraping by category, in one of `categories` (or below them, if `recursive`).
+        Only categories added with explicit [[Category:...]] links are seen; ones added by templates aren't.'''
+        if path is None:
+            path = self.dump_file
+        wanted = None
+        if self.by_category:
+            categories = self.categories or [self.category]
+            if self.recursive:
+                wanted = dump_subcategories(path, categories)
+            else:
+                wanted = {normalize_category(c) for c in categories}
+        print(f'Reading pages from {path}:')
+        for pageid, title, ns, text in tqdm(iter_dump_pages(path, self.dump_namespaces), unit=' pages'):
+            if wanted is not None and not any(normalize_category(c) in wanted for c in CATEGORY_LINK.findall(text)):
+                continue
+            heading = SECTION_HEADING.search(text)
+            yield pageid, title, text[:heading.start()] if heading else text
+
+    def scrape_dump(self):
+        '''Fill in pages, titles & raw infoboxes from `dump_file` rather than the API.'''
+        self.pages = []
+        self.raw_infoboxes = {}
+        with self.metrics.timer('read dump', profile=True):
+            for pageid, title, text in self.iter_dump_infoboxes():
+                self.pages.append((pageid, title))
+                self.raw_infoboxes[pageid] = text
+        self.pageids = [x[0] for x in self.pages]
+        self.titles = [x[1] for x in self.pages]
+        self.page_index = index_pages(self.pages)
+        self.matched_raw_infoboxes = self.match_names_to_infoboxes()
+
+    def scrape_generator(self):
+        '''Fill in pages, titles & raw infoboxes from generator queries that return each listed page's
+        section 0 along with it, so titles aren't sent back in a second round of requests and need no matching.
+        Lists the categories (and, if `recursive`, their subcategories) when scraping by category, otherwise
+        every article on the wiki. A category's continued responses have to be fetched one after another, so
+        only separate categories are fetched concurrently: this makes fewer requests, which is what counts
+        under a rate limit, but may take longer than the two-phase fetch when requests are unthrottled.'''
+        generated = {}
+        if self.by_category:
+            if not self.categories:
+                self.categories = [self.category]
+            print('Retrieving category members & their infoboxes:')
+            visited = set()
+            frontier = list(dict.fromkeys(self.categories))
+            while frontier:
+                visited.update(frontier)
+                next_frontier = []
+                results = self.concurrent_map(lambda category: self.fetch_generated_pages(
+                    {'generator': 'categorymembers',
+                     'gcmtitle': f'Category:{category}',
+                     'gcmtype': 'subcat|page' if self.recursive else 'page',
+                     'gcmlimit': 50,
+                     }), frontier)
+                for pages, subcats in tqdm(results, total=len(frontier)):
+                    generated.update(pages)
+                    if self.recursive:
+                        for subcat in subcats:
+                            if subcat not in visited:
+                                visited.add(subcat)
+                                next_frontier.append(subcat)
+                frontier = next_frontier
+        else:
+            print('Retrieving all pages & their infoboxes:')
+            generated, _ = self.fetch_generated_pages({'generator': 'allpages',
+                                                       'gapnamespace': 0,
+                                                       'gapfilterredir': 'nonredirects',
+                                                       'gaplimit': 50,
+                                                       })
+        self.pages = sorted((pageid, title) for pageid, (title, revid, text) in generated.items())
+        self.pageids = [x[0] for x in self.pages]
+        self.titles = sorted(x[1] for x in self.pages)
+        self.page_index = index_pages(self.pages)
+        self.raw_infoboxes = {pageid: text for pageid, (title, revid, text) in generated.items()}
+        self.matched_raw_infoboxes = {(pageid, title): text for pageid, (title, revid, text) in generated.items()}
+        if self.cache is not None:
+            self.cache.put_many(self.fandom_site, [(pageid, revid, text)
+                                                   for pageid, (title, revid, text) in generated.items()])
+
+    def fetch_generated_pages(self, generator_params):
+        '''Page through a generator query with prop=revisions, returning ({pageid: (title, revid, section-0 wikitext)}
+        for the articles it lists, [names of the subcategories it lists]).'''
+        params = dict(self.params, **generator_params)
+        params.pop('titles', None)
+        continued = params
+        pages = {}
+        subcats = {}
+        while True:
+            data = self.get_json(self.api_url, params=continued)
+            for v in data.get('query', {}).get('pages', {}).values():
+                if int(v['ns']) == 14:
+                    subcats[v['title'].replace('Category:', '')] = None
+                elif int(v['ns']) == 0 and 'revisions' in v:
+                    # content for the rest of a batch arrives in the rvcontinue responses that follow
+                    revision = v['revisions'][0]
+                    pages[v['pageid']] = (v['title'], revision.get('revid'), revision['slots']['main']['*'])
+            if 'continue' not in data:
+                break
+            # continue from the original query, so no stale continuation values are sent
+            continued = dict(params, **data['continue'])
+        return pages, list(subcats)
+
+    def get_raw_infoboxes(self, titles=None, params=None, progress=True):
         '''From a list of titles, get the raw json for their infoboxes'''
         if titles is None:
             titles = self.titles
@@ -282,120 +1658,89 @@ class WikiInfobox(WikiAPI):
         if params is None:
             params = self.params
 
-        # break up titles into chunks of 50 or fewer
-        title_chunks = make_list_chunks(titles)
+        if self.cache is None:
+            return self.fetch_raw_infoboxes(titles, params, progress=progress)
+
+        # only download content for pages edited since they were cached
+        revisions = self.get_revision_ids(titles, progress=progress)
+        revids = {pageid: revid for pageid, (title, revid) in revisions.items()}
+        cached = self.cache.get_many(self.fandom_site, revids)
+        stale_titles = [title for pageid, (title, revid) in revisions.items() if pageid not in cached]
+        self.metrics.incr('cache hits', len(cached))
+        self.metrics.incr('cache misses', len(stale_titles))
+        if progress:
+            print(f'{len(cached)} infoboxes unchanged since last scrape, {len(stale_titles)} to fetch.')
+        fetched_revids = {}
+        fetched = {}
+        if stale_titles:
+            fetched = self.fetch_raw_infoboxes(stale_titles, params, revids=fetched_revids, progress=progress)
+        self.cache.put_many(self.fandom_site, [(k, fetched_revids[k], v) for k, v in fetched.items()])
+        raw_infoboxes = {pageid: cached[pageid] if pageid in cached else fetched.get(pageid)
+                         for pageid in revisions}
+        return {k: v for k, v in raw_infoboxes.items() if v is not None}
 
+    def fetch_raw_infoboxes(self, titles, params, revids=None, progress=True):
+        '''Download section-0 wikitext for `titles`; if `revids` is given it is filled with {pageid: revid}.'''
+        params = {k: v for k, v in params.items() if k != 'titles'}
         raw_infoboxes = {}
-        print('Retrieving infoboxes for each page title:')
-        for chunk in tqdm(title_chunks):
-            time.sleep(1)  # add sleep so don't overwhelm server
-            title_list = '|'.join([x for x in chunk])
-            params.update({'titles': title_list})
-            r = requests.get(API_URL, params=params)
-            json_values = r.json()
-            pages = json_values['query']['pages']
+        if progress:
+            print('Retrieving infoboxes for each page title:')
+        for pages in self.fetch_title_batches(titles, params, required='revisions', progress=progress):
             boxes = {int(k): v['revisions'][0]['slots']['main']['*'] for k, v in pages.items() if int(k) > 0}
+            if revids is not None:
+                revids.update({int(k): v['revisions'][0].get('revid') for k, v in pages.items() if int(k) > 0})
             # warn if missing infoboxes
             missing_boxes = {k: v for k, v in pages.items() if int(k) < 1}
             if missing_boxes:
+                self.metrics.incr('missing pages', len(missing_boxes))
                 for v in missing_boxes.values():
                     print(f"Infobox page missing: {v['title']}")
             raw_infoboxes.update(boxes)
 
         return raw_infoboxes
 
+    def get_revision_ids(self, titles, progress=True):
+        '''Fetch only revision metadata for `titles`: returns {pageid: (title, lastrevid)} for pages that exist.'''
+        params = {'action': 'query',
+                  'format': 'json',
+                  'prop': 'info',
+                  }
+        revisions = {}
+        if progress:
+            print('Checking page revisions:')
+        for pages in self.fetch_title_batches(titles, params, required='lastrevid', progress=progress):
+            for k, v in pages.items():
+                if int(k) > 0:
+                    revisions[int(k)] = (v['title'], v['lastrevid'])
+                else:
+                    self.metrics.incr('missing pages')
+                    print(f"Infobox page missing: {v['title']}")
+        return revisions
+
     def process_value(self, val):
         """within the context of an infobox to be parsed, clean up the value after the '=' sign."""
-        val = val.replace("[[","")
-        val = val.replace("]]","")
-        val = val.replace("}}","")
-        val = val.replace("{{","")
-        val = re.sub("([\(\[]).*?([\)\]])", "\g<1>\g<2>", val)
-        val = val.replace("()","")
-
-        val = val.lstrip('*').strip()
-
-        #remove any training white spaces left
-        ##if we have a br the k becomes an array
-
-        if any(x in val for x in ['<br />', '<br>', '<br/>']):
-            val = val.replace('<br />', '<br>').replace('<br/>', '<br>')
-            val = val.split('<br>')
-            val = [x.strip() for x in val]
-
-        # transform true/false to boolean
-        if type(val) == str and val.lower() == 'true':
-            val = True
-        elif type(val) == str and val.lower() == 'false':
-            val = False
-        return val
+        return process_infobox_value(val)
 
     def parse_infobox(self, info_json, standardize_case=None):
         if standardize_case is None:
             standardize_case = self.standardize_case
-        infoboxes = {}
-        infobox_name = ''
-        k = ''
-        json_lines = info_json.splitlines()
-        for i, line in enumerate(json_lines):
-            is_list = False
-            if re.findall(r'\{\{Infobox.*?', line):
-                infobox_name = re.findall(r'Infobox.*', line)[0].strip().replace('_', ' ')
-                infoboxes[infobox_name] = {}
-            elif line.startswith('|'):
-                # process k
-                k = line.partition('=')[0].strip()[1:]
-                k = k.strip()
-                if self.standardize_case:
-                    k = k.lower()
-
-                # process val
-                val1 = line.partition('=')[-1].strip()
-                val = self.process_value(val1)
-                if type(val) == str and (val1.startswith('*') or not len(val)):
-                    is_list = True
-                    if val1.startswith('*'):
-                        assert len(val1.split('*')) == 2
-                        item_1 = val.lstrip('*').strip()
-                        val = [item_1]
-                    elif json_lines[i+1].startswith('*'):
-                        val = []
-                    else:
-                        is_list = False
-                    if is_list:
-                        assert json_lines[i+1].startswith('*')
-                        counter = 0
-                        idx = i
-                        while counter < 20:
-                            # look ahead for other list members, stopping at next parameter field
-                            if json_lines[idx+1].startswith('*'):
-                                new_item = self.process_value(json_lines[idx+1])
-                                val.append(new_item)
-                                idx += 1
-                                counter += 1
-                            else:
-                                break
-
-                elif type(val) == str:
-                    assert '*' not in val
-
-                #process k
-                if not infobox_name:
-                    print('no infobox name:', k, val[:20])
-                else:
-                    infoboxes[infobox_name][k] = val
-
-        return infoboxes
+        return parse_infobox_text(info_json, standardize_case=standardize_case)
 
     def match_names_to_infoboxes(self,
                                  categories=None,
                                  pages=None,
                                  titles=None,
                                  pageids=None,
-                                 infoboxes=None):
+                                 infoboxes=None,
+                                 page_index=None):
         '''Uses pageids to match title/name tuple to raw infobox json.'''
         if categories is None:
             categories = self.categories
+        if page_index is None:
+            if pages is None and getattr(self, 'page_index', None):
+                page_index = self.page_index
+            else:
+                page_index = index_pages(self.pages if pages is None else pages)
         if pages is None:
             pages = self.pages
         if titles is None:
@@ -412,8 +1757,9 @@ class WikiInfobox(WikiAPI):
             infoboxes = self.raw_infoboxes
         matched_raw_infoboxes = {}
         for pid in pageids:
-            title = next(x[1] for x in pages if x[0] == pid)
-            matched_raw_infoboxes[(pid, title)] = infoboxes[pid]
+            # pages deleted since they were listed, or that couldn't be fetched, have no wikitext
+            if pid in infoboxes:
+                matched_raw_infoboxes[(pid, page_index[pid])] = infoboxes[pid]
         return matched_raw_infoboxes
 
     def get_parsed_infoboxes(self, titles=None, raw_infoboxes=None, standardize_case=None):
@@ -425,22 +1771,62 @@ class WikiInfobox(WikiAPI):
         if standardize_case is None:
             standardize_case = self.standardize_case
 
-        matched_infoboxes = self.match_names_to_infoboxes(titles=titles, infoboxes=raw_infoboxes)
+        if raw_infoboxes is getattr(self, 'raw_infoboxes', None) and getattr(self, 'matched_raw_infoboxes', None):
+            matched_infoboxes = self.matched_raw_infoboxes
+        else:
+            matched_infoboxes = self.match_names_to_infoboxes(titles=titles, infoboxes=raw_infoboxes)
 
-        infoboxes = {k: self.parse_infobox(v, standardize_case=standardize_case) for k, v in matched_infoboxes.items()}
+        if self.parse_in_parallel(len(matched_infoboxes)):
+            infoboxes = parse_infoboxes_parallel(matched_infoboxes, standardize_case, workers=self.parse_workers)
+        else:
+            infoboxes = {k: self.parse_infobox(v, standardize_case=standardize_case) for k, v in matched_infoboxes.items()}
+        self.metrics.incr('pages parsed', len(infoboxes))
+        self.metrics.incr('pages without infobox', sum(1 for v in infoboxes.values() if not v))
         return infoboxes
 
+    def parse_in_parallel(self, n_pages):
+        '''Whether `n_pages` pages are worth parsing on a process pool: more than one core & enough pages.'''
+        return (self.parse_workers or os.cpu_count() or 1) > 1 and n_pages >= self.parallel_parse_threshold
+
+    def get_infobox_stores(self, matched_infoboxes=None, standardize_case=None, alert_empty=None):
+        '''Parse the matched raw infoboxes straight into an `InfoboxStore` per template ({template: store}),
+        in place of `get_parsed_infoboxes` & `sort_infoboxes_by_template`.'''
+        if matched_infoboxes is None:
+            matched_infoboxes = self.matched_raw_infoboxes
+        if standardize_case is None:
+            standardize_case = self.standardize_case
+        if alert_empty is None:
+            alert_empty = self.alert_empty
+        if self.parse_in_parallel(len(matched_infoboxes)):
+            parsed = parse_infoboxes_parallel(matched_infoboxes, standardize_case, workers=self.parse_workers).items()
+        else:
+            parsed = ((k, self.parse_infobox(v, standardize_case=standardize_case)) for k, v in matched_infoboxes.items())
+        stores = {}
+        empty = []
+        for (pageid, title), infoboxes in parsed:
+            if not infoboxes:
+                empty.append((pageid, title))
+            for infobox_name, infobox in infoboxes.items():
+                if infobox_name not in stores:
+                    stores[infobox_name] = InfoboxStore()
+                stores[infobox_name].add(pageid, title, infobox)
+        self.metrics.incr('pages parsed', len(matched_infoboxes))
+        self.metrics.incr('pages without infobox', len(empty))
+        if alert_empty and empty:
+            print(f"These entries are missing infoboxes and will not be in df: {empty}")
+        return stores
+
     def get_infoboxes_for_title(self, title, standardize_case=None, parsed=True):
         """For a single title, get the article infoboxes. Do not use to iterate!
-        Use chunking via `self.get_parsed_infoboxes()` instead."""
+        Use chunking via `self.get_parsed_infoboxes()` instead, or an `InfoboxLookup` for on-demand lookups."""
         if standardize_case is None:
             standardize_case = self.standardize_case
         title = '_'.join(title.split())
-        fullurl = '/'.join([FANDOM_URL, title])
-        r = requests.get(fullurl, params={'action': 'raw',
-                                          'section': '0',
-                                          'format': 'json',
-                                          })
+        fullurl = '/'.join([self.fandom_url, title])
+        r = self.get(fullurl, params={'action': 'raw',
+                                      'section': '0',
+                                      'format': 'json',
+                                      })
         page = r.text
         if parsed:
             parsed_infobox = self.parse_infobox(page, standardize_case=standardize_case)
@@ -448,16 +1834,91 @@ class WikiInfobox(WikiAPI):
         else:
             return page
 
-    def write_infobox_json(self, categories=None, df=None):
+    def iter_parsed_infoboxes(self, titles=None, standardize_case=None, block_size=None):
+        '''Yield ((pageid, title), parsed infoboxes) page by page, fetching and parsing `block_size` titles
+        at a time, so only one block of wikitext is ever held in memory.'''
+        if titles is None:
+            titles = self.titles
+        if standardize_case is None:
+            standardize_case = self.standardize_case
+        if block_size is None:
+            block_size = 200 * self.max_concurrency
+        page_index = getattr(self, 'page_index', None) or index_pages(self.pages)
+        print('Streaming infoboxes for each page title:')
+        for block in tqdm(make_list_chunks(titles, block_size)):
+            raw_infoboxes = self.get_raw_infoboxes(block, progress=False)
+            for pid, text in raw_infoboxes.items():
+                yield (pid, page_index[pid]), self.parse_infobox(text, standardize_case=standardize_case)
+
+    def build_stream(self, path=None, fmt='json', template=None):
+        '''Scrape, parse & write infoboxes as a stream instead of via `build()` and DataFrames, keeping
+        memory flat however large the category is.
+        fmt='json' writes one infobox template (default: the first one seen) as a JSON object keyed by
+        page title, like `write_infobox_json`; fmt='jsonl' writes every infobox as a line of JSON.'''
+        if path is None:
+            path = self.json_file if fmt == 'json' else self.site_path('.jsonl')
+        if self.dump_file:
+            records = (((pageid, title), self.parse_infobox(text)) for pageid, title, text in self.iter_dump_infoboxes())
+        else:
+            self.get_page_list()
+            if not self.titles:
+                self.finish_crawl()
+                return
+            records = self.iter_parsed_infoboxes()
+        if fmt not in ('json', 'jsonl'):
+            raise ValueError(f"Unknown stream format: {fmt}")
+        with self.metrics.timer('stream infoboxes', profile=True):
+            if fmt == 'jsonl':
+                write_infoboxes_jsonl(records, path)
+            else:
+                write_infoboxes_json_stream(records, path, template=template)
+        self.finish_crawl()
+        self.write_run_report(path)
+
+    def write_infobox_json(self, categories=None, df=None, path=None):
         '''Output infobox dict to json file'''
+        if path is None:
+            path = self.json_file
         if categories is None:
             categories = self.categories
         if df is None:
             df = next(iter(self.dfs.values()))
-        df = df.set_index('page_title', drop=True)
-        json_data = df.to_json(indent=4, orient='index')
-        with open(JSON_FILE, 'w') as f:
-            f.write(json_data)
+        with self.metrics.timer('write json', profile=True):
+            df = df.set_index('page_title', drop=True)
+            json_data = df.to_json(indent=4, orient='index')
+            with open(path, 'w') as f:
+                f.write(json_data)
+        if self.write_index:
+            with self.metrics.timer('write index', profile=True):
+                build_index(infobox_index_records(df.reset_index()), os.path.splitext(path)[0] + '.idx')
+        self.write_run_report(path)
+
+    def write_infobox_parquet(self, directory=None, dfs=None):
+        '''Output each infobox template's DataFrame, with typed columns, to its own parquet file.
+        Needs pyarrow (or fastparquet) installed.'''
+        if directory is None:
+            directory = self.site_path('_parquet')
+        if dfs is None:
+            dfs = self.dfs
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        with self.metrics.timer('write parquet', profile=True):
+            for infobox_name, df in dfs.items():
+                path = os.path.join(directory, infobox_name.lower().replace(' ', '_') + '.parquet')
+                type_infobox_df(df).to_parquet(path, index=False)
+                paths.append(path)
+        self.write_run_report(os.path.join(directory, 'run'))
+        return paths
+
+    def build_relation_graph(self, df=None, path=None):
+        '''Extract the relationship graph from the primary infobox DataFrame & write its edge list to csv.'''
+        if df is None:
+            df = next(iter(self.dfs.values()))
+        if path is None:
+            path = self.site_path('_relations.csv')
+        self.relation_graph = RelationGraph.from_df(df)
+        self.relation_graph.write_edges(path)
+        return self.relation_graph
 
     def sort_infoboxes_by_template(self, infoboxes=None, alert_empty=None):
         if alert_empty is None:
@@ -481,7 +1942,7 @@ class WikiInfobox(WikiAPI):
         df.index.set_names(["pageid", "page_title"], inplace=True)
         df = df.reset_index()
         df.pageid = df.pageid.astype(int)
-        df = df.replace('PAGENAME', np.NaN)
+        df = df.replace('PAGENAME', np.nan)
         return df
 
     def build_dfs_infobox(self, infoboxes=None):
@@ -489,12 +1950,210 @@ class WikiInfobox(WikiAPI):
             infoboxes = self.infoboxes
         dfs_dict = {}
         for infobox_name, val in infoboxes.items():
-            dfs_dict[infobox_name] = self.build_df_infobox(val)
+            if isinstance(val, InfoboxStore):
+                dfs_dict[infobox_name] = val.to_df()
+            else:
+                dfs_dict[infobox_name] = self.build_df_infobox(val)
+            if self.clean_dfs:
+                dfs_dict[infobox_name] = clean_infobox_df(dfs_dict[infobox_name], self.clean_suffixes)
             df_name = 'df_' + infobox_name.replace('Infobox ', '').lower()
             setattr(self, df_name, dfs_dict[infobox_name])
         return dfs_dict
 
 
+class InfoboxLookup:
+    '''On-demand, memoized infobox lookups by title, for services that ask for one page at a time.
+    Titles requested within `window` seconds of each other are fetched together, up to `max_batch` per
+    revisions query, on the wiki's session & rate limit; concurrent requests for the same title share one fetch.
+    Parsed infoboxes ({template: {field: value}}, or None for a missing page) are kept in an LRU cache of
+    `cache_size` titles for `ttl` seconds. Cached results are shared, so treat them as read-only.
+
+        with InfoboxLookup(WikiInfobox()) as lookup:
+            future = lookup.submit('Ken Barlow')       # a concurrent.futures.Future
+            infoboxes = lookup.get('Deirdre Barlow')   # blocks until fetched
+            infoboxes = await lookup.aget('Rita Tanner')
+    '''
+    def __init__(self, wiki=None, window=0.05, max_batch=50, cache_size=10000, ttl=3600, standardize_case=None):
+        self.wiki = wiki if wiki is not None else WikiInfobox()
+        self.window = window
+        self.max_batch = max_batch
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.standardize_case = self.wiki.standardize_case if standardize_case is None else standardize_case
+        self.params = {k: v for k, v in self.wiki.params.items() if k != 'titles'}
+        self.cache = OrderedDict()  # title: (expiry, infoboxes)
+        self.pending = {}  # title: [futures]
+        self.queue = deque()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.executor = ThreadPoolExecutor(max_workers=self.wiki.max_concurrency)
+        self.dispatcher = threading.Thread(target=self.dispatch, daemon=True)
+        self.dispatcher.start()
+
+    def submit(self, title):
+        '''A Future for the parsed infoboxes of `title`, resolved from the cache when possible.'''
+        title = normalize_title(title)
+        future = Future()
+        with self.condition:
+            if self.closed:
+                raise RuntimeError('InfoboxLookup is closed')
+            cached = self.cache.get(title)
+            if cached is not None and cached[0] > time.monotonic():
+                self.cache.move_to_end(title)
+                self.wiki.metrics.incr('lookup hits')
+                future.set_result(cached[1])
+                return future
+            self.wiki.metrics.incr('lookup misses')
+            if title in self.pending:
+                self.pending[title].append(future)
+            else:
+                self.pending[title] = [future]
+                self.queue.append(title)
+                self.condition.notify()
+        return future
+
+    def get(self, title, timeout=None):
+        '''The parsed infoboxes of `title`, waiting for them to be fetched if need be.'''
+        return self.submit(title).result(timeout)
+
+    async def aget(self, title):
+        '''Awaitable form of `get`.'''
+        return await asyncio.wrap_future(self.submit(title))
+
+    def dispatch(self):
+        '''Collect queued titles for up to `window` seconds (or until a batch is full) and fetch them as a batch.'''
+        while True:
+            with self.condition:
+                while not self.queue and not self.closed:
+                    self.condition.wait()
+                if not self.queue:
+                    return
+                deadline = time.monotonic() + self.window
+                while len(self.queue) < self.max_batch and not self.closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                batch = [self.queue.popleft() for _ in range(min(self.max_batch, len(self.queue)))]
+            self.executor.submit(self.fetch, batch)
+
+    def fetch(self, titles):
+        '''Fetch & parse a batch of titles, then cache them & resolve their futures.'''
+        self.wiki.metrics.incr('lookup batches')
+        self.wiki.metrics.observe('lookup batch size', len(titles), buckets=[1, 2, 5, 10, 20, 50, float('inf')])
+        normalized = {}
+        try:
+            pages = self.wiki.fetch_title_batch(titles, self.params, required='revisions', normalized=normalized)
+            results = {}
+            for pageid, page in pages.items():
+                if int(pageid) > 0:
+                    text = page['revisions'][0]['slots']['main']['*']
+                    results[page['title']] = parse_infobox_text(text, standardize_case=self.standardize_case)
+                else:
+                    results[page['title']] = None
+        except Exception as error:
+            results, failure = {}, error
+        else:
+            failure = None
+        expiry = time.monotonic() + self.ttl
+        with self.condition:
+            resolved = []
+            for title in titles:
+                futures = self.pending.pop(title, [])
+                # results are keyed by the page's own title, which the API may have normalized (case,
+                # namespace prefix) or converted from the one asked for
+                page_title = title
+                for _ in range(len(normalized)):
+                    if page_title not in normalized:
+                        break
+                    page_title = normalized[page_title]
+                if page_title in results:
+                    for key in {title, page_title}:
+                        self.cache[key] = (expiry, results[page_title])
+                        self.cache.move_to_end(key)
+                resolved.append((futures, title, page_title))
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        for futures, title, page_title in resolved:
+            for future in futures:
+                if page_title in results:
+                    future.set_result(results[page_title])
+                else:
+                    future.set_exception(failure or LookupError(f'Could not fetch {title}'))
+
+    def clear(self):
+        '''Forget every cached result.'''
+        with self.condition:
+            self.cache.clear()
+
+    def close(self):
+        '''Fetch whatever is still queued, then stop.'''
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.dispatcher.join()
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CrawlScheduler:
+    '''Scrape several fandom sites at once from a list of (site, categories) jobs.
+    Every site runs as its own `WikiInfobox` with its own rate limit & concurrency budget, so total throughput
+    grows with the number of sites; jobs naming the same site are merged so they share that site's budget.
+    Each site's primary infobox is written to its own projects/<site>.json.
+
+    `options` are passed to every site's `WikiInfobox` and `site_options` ({site: options}) override them per
+    site, e.g. a faster `rate_limit` for one host. A '{site}' in `checkpoint_file` or `cache_file` is filled
+    in with the site name. At most `max_sites` sites are crawled at once (default: all of them); the rest
+    start, in job order, as others finish.'''
+    def __init__(self, jobs, max_sites=None, site_options=None, **options):
+        self.jobs = {}
+        for site, categories in jobs:
+            if isinstance(categories, str):
+                categories = [categories]
+            self.jobs.setdefault(site, [])
+            self.jobs[site].extend(c for c in categories if c not in self.jobs[site])
+        self.max_sites = max_sites or max(1, len(self.jobs))
+        self.site_options = site_options or {}
+        self.options = options
+        self.infoboxes = {}
+        self.errors = {}
+
+    def site_infobox(self, site, categories):
+        '''The `WikiInfobox` that scrapes one site.'''
+        options = dict(self.options, **self.site_options.get(site, {}))
+        for key in ('checkpoint_file', 'cache_file'):
+            if options.get(key):
+                options[key] = options[key].format(site=site)
+        return WikiInfobox(fandom_site=site, categories=categories, **options)
+
+    def run_site(self, site, categories):
+        wi = self.site_infobox(site, categories)
+        wi.build()
+        if getattr(wi, 'dfs', None):
+            wi.write_infobox_json()
+        return wi
+
+    def run(self):
+        '''Crawl every site, returning {site: output path}. A site that fails doesn't stop the others;
+        its exception is kept in `errors`.'''
+        with ThreadPoolExecutor(max_workers=self.max_sites) as executor:
+            futures = {site: executor.submit(self.run_site, site, categories)
+                       for site, categories in self.jobs.items()}
+            for site, future in futures.items():
+                try:
+                    self.infoboxes[site] = future.result()
+                except Exception as error:
+                    print(f'Scraping {site} failed: {error!r}')
+                    self.errors[site] = error
+        return {site: wi.json_file for site, wi in self.infoboxes.items() if getattr(wi, 'dfs', None)}
+
+
 if __name__ == "__main__":
     print(f'Getting {CATEGORIES} infoboxes from fandom site {FANDOM_SITE}\n')
     # create WikiInfobox instance with default values
@@ -1,36 +1,14 @@
-import requests
-import urllib.request
-import json
-import re
-from main import JSON_FILE
+import csv
+from main import JSON_FILE, RelationGraph
 
 
 if __name__ == "__main__":
 
-    csv = ""
+    graph = RelationGraph.from_json(JSON_FILE, fields=['spouse(s)'])
 
-    with open(JSON_FILE) as data_file:
-        data = json.load(data_file)
-        for v in data.items():
-            try:
-                if isinstance(v[1]['spouse(s)'], list):
-                    print ("a list!")
-                    for itemsv in v[1]['spouse(s)']:
-                        if v[1]['spouse(s)'] != "":
-                            csv = csv + v[0] + "," + itemsv + "\n"
-                            print("writing the following line")
-                            print(v[0] + "," + v[1]['spouse(s)'] + "\n")
-                else:
-                    print ("not a list")
-                    if v[1]['spouse(s)'] != "":
-                        print("writing the following line")
-                        print(v[0] + "," + v[1]['spouse(s)'] + "\n")
-                        csv = csv + v[0] + "," + v[1]['spouse(s)'] + "\n"
-
-                
-            except:
-                print("Doing nothing")
-        
-        print(csv)
-        f = open("corrie.csv", 'w') 
-        f.write(csv)
\ No newline at end of file
+    with open("corrie.csv", 'w', newline='') as f:
+        writer = csv.writer(f)
+        for source_pageid, source_title, relation, name, target_pageid, target_title in graph.iter_edges():
+            print("writing the following line")
+            print(source_title + "," + name)
+            writer.writerow([source_title, name])
@@ -0,0 +1,53 @@
+'''Batches of titles too big for a request are split; failures that survive `get`'s retries are raised.'''
+import os
+
+import pytest
+import requests
+
+import main
+from benchmarks.replay import ReplayServer, SyntheticWiki
+from main import WikiInfobox
+
+TITLES = [f'Character {i}' for i in range(1, 201)]
+PARAMS = {'action': 'query', 'format': 'json', 'prop': 'revisions', 'rvprop': 'content', 'rvslots': '*',
+          'rvsection': '0'}
+
+
+def infobox(server, tmp_path, **options):
+    return WikiInfobox(**dict(dict(fandom_site='synthetic', fandom_url=server.url, api_url=server.api_url,
+                                   rate_limit=None, maxlag=None, backoff_factor=0.001, write_report=False,
+                                   json_file=os.path.join(str(tmp_path), 'synthetic.json')), **options))
+
+
+def test_long_urls_are_split(tmp_path, monkeypatch):
+    # send every query as a GET, so the server refuses the longer ones with a 414
+    monkeypatch.setattr(main, 'MAX_QUERY_LENGTH', 10**6)
+    with ReplayServer(SyntheticWiki(1000), max_url_length=600) as server:
+        wi = infobox(server, tmp_path)
+        pages = {}
+        for batch in wi.get_batch_sizer().batches(TITLES):
+            pages.update(wi.fetch_title_batch(batch, PARAMS, required='revisions'))
+    assert sorted(v['title'] for v in pages.values()) == sorted(TITLES)
+    assert wi.metrics.counters['failed batches'] > 0
+    assert not wi.metrics.counters.get('failed titles')
+
+
+def test_transport_failures_are_raised(tmp_path):
+    with ReplayServer(SyntheticWiki(1000)) as server:
+        wi = infobox(server, tmp_path, max_retries=2)
+        wi.get_batch_sizer()
+        server.error_rate = 1.0
+        before = server.stats['requests']
+        with pytest.raises(requests.RequestException):
+            wi.fetch_title_batch(TITLES[:50], PARAMS, required='revisions')
+    # the batch is retried by get(), not split into dozens of smaller failing batches
+    assert server.stats['requests'] - before == 3
+
+
+def test_category_listing_uses_callers_retry_settings(tmp_path):
+    with ReplayServer(SyntheticWiki(1000), error_rate=1.0) as server:
+        wi = infobox(server, tmp_path, categories=['Characters'], max_retries=0)
+        with pytest.raises(requests.RequestException):
+            wi.get_page_list()
+    # one attempt, not the lister's own default of five retries
+    assert server.stats['requests'] == 1
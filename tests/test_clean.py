@@ -0,0 +1,87 @@
+'''The DataFrame cleaning & typing stages cope with columns that have no values to parse.'''
+import os
+import random
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.replay import ReplayServer, SyntheticWiki
+from main import WikiInfobox, clean_infobox_df, parse_infobox_dates, remove_suffix, remove_suffixes, type_infobox_df
+
+
+def test_parse_dates():
+    dates = parse_infobox_dates(pd.Series(['8th March 1950 <!-- per ITV -->', None, 'c.1987', '17 February'],
+                                          index=[3, 4, 5, 6], name='born'))
+    assert dates.dtype == 'datetime64[ns]'
+    assert dates.index.tolist() == [3, 4, 5, 6]
+    assert dates.name == 'born'
+    assert dates[3] == pd.Timestamp('1950-03-08')
+    assert dates[4:].isna().all()
+
+
+def test_parse_dates_all_missing():
+    dates = parse_infobox_dates(pd.Series([None, None], dtype=object, index=[1, 2]))
+    assert dates.dtype == 'datetime64[ns]'
+    assert dates.index.tolist() == [1, 2]
+    assert dates.isna().all()
+    assert parse_infobox_dates(pd.Series([], dtype=object)).dtype == 'datetime64[ns]'
+
+
+def test_clean_appearance_without_dates():
+    df = pd.DataFrame({'page_title': ['A', 'B'], 'last appearance': ['[[Episode 1]]', '[[Episode 2]]']})
+    cleaned = clean_infobox_df(df)
+    assert cleaned['last appearance date'].dtype == 'datetime64[ns]'
+    assert cleaned['last appearance date'].isna().all()
+
+
+def test_type_all_missing_dates():
+    df = pd.DataFrame({'pageid': [1, 2], 'page_title': ['A', 'B'], 'born': ['8 March 1950', None],
+                       'died': pd.Series([None, None], dtype=object)})
+    typed = type_infobox_df(df)
+    assert typed['died'].dtype == 'datetime64[ns]'
+    assert typed['died'].isna().all()
+    assert typed['born'][0] == pd.Timestamp('1950-03-08')
+
+
+def test_build_clean_dfs(tmp_path):
+    with ReplayServer(SyntheticWiki(200)) as server:
+        wi = WikiInfobox(fandom_site='synthetic', fandom_url=server.url, api_url=server.api_url,
+                         categories=['Characters'], rate_limit=None, maxlag=None, write_report=False,
+                         json_file=os.path.join(str(tmp_path), 'synthetic.json'), clean_dfs=True)
+        wi.build()
+    # the synthetic pages' last appearances are episode links without a date
+    for df in wi.dfs.values():
+        assert df['last appearance episode'].notna().all()
+        assert df['last appearance date'].isna().all()
+        assert df['first appearance date'].notna().all()
+
+
+def remove_suffixes_one_by_one(cell, suffix_list):
+    '''What remove_suffixes did before it was vectorized, for one cell.'''
+    for suffix in suffix_list:
+        if isinstance(cell, str) and cell and cell.endswith(suffix):
+            cell = remove_suffix(cell, suffix).strip()
+    return cell
+
+
+def test_remove_suffixes_matches_one_by_one():
+    rng = random.Random(0)
+    pieces = ['Ken Barlow', ' ', '  ', '*', '(deceased)', 'a', 'ba', ' (deceased)', '']
+    for suffix_list in (['(deceased)', '*'], ['*', '(deceased)'], ['a', 'ba'], ['ba', 'a', ' '], ['*']):
+        values = [''.join(rng.choice(pieces) for _ in range(rng.randint(0, 4))) for _ in range(2000)]
+        values += [None, np.nan, True, ['x *']]
+        df = pd.DataFrame({'value': pd.Series(values, dtype=object)})
+        expected = [remove_suffixes_one_by_one(v, suffix_list) for v in values]
+        actual = remove_suffixes(df, None, suffix_list)['value'].tolist()
+        assert actual[:-4] == expected[:-4], suffix_list
+        assert actual[-4] is None and np.isnan(actual[-3]) and actual[-2] is True and actual[-1] == ['x *']
+    assert remove_suffixes(pd.DataFrame({'name': ['Ken Barlow * (deceased)']}), None,
+                           ['(deceased)', '*'])['name'][0] == 'Ken Barlow'
+
+
+def test_remove_suffixes_skips_booleans():
+    # e.g. an alive = true field that some pages leave out
+    df = pd.DataFrame({'name': ['Ken Barlow *', 'Rita Tanner'], 'alive': pd.Series([True, np.nan], dtype=object)})
+    cleaned = clean_infobox_df(df, ['*'])
+    assert cleaned['name'].tolist() == ['Ken Barlow', 'Rita Tanner']
+    assert cleaned['alive'].equals(df['alive'])
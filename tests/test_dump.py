@@ -0,0 +1,34 @@
+'''Scraping a wiki's XML dump gives the same infoboxes as scraping it through the API.'''
+import os
+
+import pandas as pd
+
+from benchmarks.replay import ReplayServer, SyntheticWiki
+from main import WikiInfobox, iter_dump_pages
+
+
+def test_dump_matches_api(tmp_path):
+    wiki = SyntheticWiki(600, subcats=3)
+    dump = str(tmp_path / 'synthetic.xml.bz2')
+    wiki.write_dump(dump, page_bytes=2000)
+    options = dict(fandom_site='synthetic', categories=['Characters'], recursive=True, write_report=False,
+                   json_file=str(tmp_path / 'synthetic.json'))
+    from_dump = WikiInfobox(dump_file=dump, **options)
+    from_dump.build()
+    with ReplayServer(wiki) as server:
+        from_api = WikiInfobox(fandom_url=server.url, api_url=server.api_url, rate_limit=None, maxlag=None,
+                               **options)
+        from_api.build()
+    assert sorted(from_dump.dfs) == sorted(from_api.dfs)
+    for template, df in from_api.dfs.items():
+        pd.testing.assert_frame_equal(from_dump.dfs[template].sort_values('pageid', ignore_index=True),
+                                      df.sort_values('pageid', ignore_index=True))
+
+
+def test_only_page_elements_are_pages(tmp_path):
+    path = os.path.join(str(tmp_path), 'dump.xml')
+    with open(path, 'w') as f:
+        f.write('<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.11/">'
+                '<page><title>A</title><ns>0</ns><id>1</id><revision><text>a</text></revision></page>'
+                '<subpage><title>B</title><ns>0</ns><id>2</id></subpage></mediawiki>')
+    assert list(iter_dump_pages(path)) == [(1, 'A', 0, 'a')]
@@ -0,0 +1,26 @@
+'''The field index takes every value the parser makes, nested lists included.'''
+import os
+
+from benchmarks.replay import write_dump_page
+from infobox_index import InfoboxIndex
+from main import WikiInfobox
+
+ELSIE = ('{{Infobox character\n|name = Elsie Tanner\n|spouse(s) =\n* [[Arnold Tanner]]<br>[[Steve Tanner]]\n'
+         '* [[Alan Howard]]\n}}')
+
+
+def test_index_nested_lists(tmp_path):
+    dump = os.path.join(str(tmp_path), 'dump.xml')
+    with open(dump, 'w') as f:
+        f.write('<mediawiki>\n')
+        write_dump_page(f, 7, 'Elsie Tanner', 0, ELSIE)
+        f.write('</mediawiki>\n')
+    path = os.path.join(str(tmp_path), 'elsie.json')
+    wi = WikiInfobox(fandom_site='synthetic', dump_file=dump, by_category=False, json_file=path)
+    wi.build()
+    assert next(iter(wi.dfs.values()))['spouse(s)'][0] == [['Arnold Tanner', 'Steve Tanner'], 'Alan Howard']
+    wi.write_infobox_json()
+    assert os.path.exists(os.path.join(str(tmp_path), 'elsie.report.json'))
+    with InfoboxIndex(os.path.join(str(tmp_path), 'elsie.idx')) as index:
+        for name in ('Arnold Tanner', 'Steve Tanner', 'Alan Howard'):
+            assert index.lookup('spouse(s)', name) == [(7, 'Elsie Tanner')]
@@ -0,0 +1,120 @@
+'''An interrupted crawl resumed from its checkpoint journal writes the same output as an uninterrupted one,
+without fetching anything twice.'''
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import pytest
+
+from benchmarks.replay import ReplayServer, SyntheticWiki
+from main import CrawlJournal, WikiInfobox
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# run in a child process so it can be killed mid-crawl, as a crash would
+CRAWL = '''
+import sys
+sys.path.insert(0, {root!r})
+from main import WikiInfobox
+wi = WikiInfobox(**{options!r})
+if {stream!r}:
+    wi.build_stream({output!r}, fmt='jsonl')
+else:
+    wi.build()
+    wi.write_infobox_json(path={output!r})
+'''
+
+
+def infobox(server, directory, **options):
+    return WikiInfobox(**crawl_options(server, directory, **options))
+
+
+def crawl_options(server, directory, **options):
+    return dict(dict(fandom_site='synthetic', fandom_url=server.url, api_url=server.api_url,
+                     categories=['Characters'], recursive=True, rate_limit=None, max_concurrency=4, maxlag=None,
+                     backoff_factor=0.01, write_report=False, write_index=False,
+                     json_file=os.path.join(str(directory), 'synthetic.json')), **options)
+
+
+def run(wi, output, stream):
+    if stream:
+        wi.build_stream(output, fmt='jsonl')
+    else:
+        wi.build()
+        wi.write_infobox_json(path=output)
+    with open(output, 'rb') as f:
+        return f.read()
+
+
+def kill_after(server, options, output, stream, requests):
+    '''Start a crawl in a child process and SIGKILL it once the server has answered `requests` requests.'''
+    before = server.stats['requests']
+    child = subprocess.Popen([sys.executable, '-c', CRAWL.format(root=ROOT, options=options, output=output,
+                                                                   stream=stream)],
+                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while server.stats['requests'] - before < requests:
+            assert child.poll() is None, 'the crawl finished before it could be interrupted'
+            time.sleep(0.001)
+        child.send_signal(signal.SIGKILL)
+    finally:
+        child.wait()
+
+
+@pytest.mark.parametrize('stream', [False, True], ids=['build', 'build_stream'])
+@pytest.mark.parametrize('high_limits', [False, True], ids=['limit 50', 'limit 500'])
+def test_resumed_crawl_matches_uninterrupted(tmp_path, stream, high_limits):
+    wiki = SyntheticWiki(3000, high_limits=high_limits)
+    with ReplayServer(wiki, latency=0.01) as server:
+        clean = infobox(server, tmp_path / 'clean', checkpoint_file=str(tmp_path / 'clean.journal'))
+        os.makedirs(tmp_path / 'clean')
+        expected = run(clean, str(tmp_path / 'clean.out'), stream)
+        clean_requests = clean.metrics.counters['requests']
+
+        journal = str(tmp_path / 'crawl.journal')
+        output = str(tmp_path / 'resumed.out')
+        os.makedirs(tmp_path / 'resumed')
+        options = crawl_options(server, tmp_path / 'resumed', checkpoint_file=journal)
+        kill_after(server, options, output, stream, requests=clean_requests // 2)
+        with open(journal) as f:
+            journaled = sum(1 for _ in f)
+        assert journaled
+
+        resumed = WikiInfobox(**options)
+        assert run(resumed, output, stream) == expected
+        # every journaled response is used, and only the rest are fetched
+        assert resumed.metrics.counters['journal replays'] >= journaled - 1  # the last line may be torn
+        assert resumed.metrics.counters['requests'] + resumed.metrics.counters['journal replays'] == clean_requests
+        assert not os.path.exists(journal)
+
+
+def test_finished_stream_starts_afresh(tmp_path):
+    wiki = SyntheticWiki(500)
+    journal = str(tmp_path / 'crawl.journal')
+    output = str(tmp_path / 'out.jsonl')
+    with ReplayServer(wiki) as server:
+        first = run(infobox(server, tmp_path, checkpoint_file=journal), output, stream=True)
+        assert not os.path.exists(journal)
+        wiki.n_pages = 1000
+        wi = infobox(server, tmp_path, checkpoint_file=journal)
+        second = run(wi, output, stream=True)
+        assert wi.metrics.counters.get('journal replays', 0) == 0
+        assert second.count(b'\n') > first.count(b'\n')
+
+
+def test_journal_holds_only_responses_to_replay(tmp_path):
+    path = str(tmp_path / 'crawl.journal')
+    journal = CrawlJournal(path)
+    for i in range(100):
+        journal.record(f'request {i}', {'text': 'x' * 1000})
+    # recorded responses go to disk, not memory
+    assert not journal.entries
+    journal.file.close()
+
+    resumed = CrawlJournal(path)
+    assert len(resumed.entries) == 100
+    assert resumed.replay('request 7') == {'text': 'x' * 1000}
+    assert resumed.replay('request 7') is None
+    assert len(resumed.entries) == 99
@@ -0,0 +1,32 @@
+'''InfoboxLookup batches concurrent lookups, resolves titles as the API normalizes them, and caches results.'''
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.replay import ReplayServer, SyntheticWiki
+from main import InfoboxLookup, WikiInfobox, parse_infobox_text
+
+
+def test_lookup(tmp_path):
+    wiki = SyntheticWiki(1000)
+    with ReplayServer(wiki, latency=0.01) as server:
+        wi = WikiInfobox(fandom_site='synthetic', fandom_url=server.url, api_url=server.api_url, rate_limit=None,
+                         maxlag=None, write_report=False, json_file=os.path.join(str(tmp_path), 'synthetic.json'))
+        titles = [f'Character {i}' for i in range(1, 201)] * 2
+        with InfoboxLookup(wi) as lookup:
+            with ThreadPoolExecutor(32) as executor:
+                results = list(executor.map(lookup.get, titles))
+            assert results == [parse_infobox_text(wiki.text(i)) for i in list(range(1, 201)) * 2]
+            # far fewer requests than lookups, and none for the repeats
+            assert wi.metrics.counters['requests'] < 20
+            assert wi.metrics.counters['lookup hits'] + wi.metrics.counters['lookup misses'] == len(titles)
+
+            # titles the API normalizes (case, underscores, namespace prefixes) resolve to what it returns
+            assert lookup.get('character_12') == results[11]
+            assert lookup.get('  character   13 ') == results[12]
+            assert lookup.get('category:characters') is None
+            assert lookup.get('No such page') is None
+
+            requests = wi.metrics.counters['requests']
+            assert lookup.get('Character 12') == results[11]
+            assert lookup.get('character_12') == results[11]
+            assert wi.metrics.counters['requests'] == requests
@@ -0,0 +1,19 @@
+'''The template tokenizer gives the same infoboxes as the line-by-line parser it replaced.
+The cases are pages of the coronationstreet corpus (rebuilt as wikitext from projects/coronationstreet.json)
+and hand-written ones covering bullet lists, <br> lists, bullets containing <br>, inline templates,
+[[target|label]] links, comments, booleans and pages with several infoboxes or none. Each case's expected
+infoboxes are what the old parser made of it.'''
+import json
+import os
+
+import pytest
+
+from main import parse_infobox_text
+
+with open(os.path.join(os.path.dirname(__file__), 'fixtures', 'infobox_parser_cases.json'), encoding='utf-8') as f:
+    CASES = json.load(f)
+
+
+@pytest.mark.parametrize('case', CASES, ids=[case['title'] for case in CASES])
+def test_parse_infobox_text(case):
+    assert parse_infobox_text(case['wikitext']) == case['infoboxes']
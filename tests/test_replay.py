@@ -0,0 +1,24 @@
+'''A fixture recorded from a wiki replays to the same infoboxes, asking only for the batches recorded.'''
+import pandas as pd
+
+from benchmarks.replay import RecordedWiki, ReplayServer, SyntheticWiki, record
+from main import WikiInfobox
+
+
+def test_record_then_replay(tmp_path):
+    fixture = str(tmp_path / 'synthetic.jsonl.gz')
+    options = dict(fandom_site='synthetic', categories=['Characters'], rate_limit=None, maxlag=None)
+    with ReplayServer(SyntheticWiki(6000, high_limits=True)) as server:
+        record(fixture, all_pages=False, fandom_url=server.url, api_url=server.api_url,
+               json_file=str(tmp_path / 'recorded.json'), **options)
+        live = WikiInfobox(fandom_url=server.url, api_url=server.api_url, write_report=False,
+                           json_file=str(tmp_path / 'live.json'), **options)
+        live.build()
+    with ReplayServer(RecordedWiki(fixture)) as server:
+        replayed = WikiInfobox(fandom_url=server.url, api_url=server.api_url, batch_size=50, max_retries=0, write_report=False,
+                               json_file=str(tmp_path / 'replayed.json'), **options)
+        replayed.build()
+    assert sorted(replayed.dfs) == sorted(live.dfs)
+    for template, df in live.dfs.items():
+        pd.testing.assert_frame_equal(replayed.dfs[template].sort_values('pageid', ignore_index=True),
+                                      df.sort_values('pageid', ignore_index=True))
@@ -0,0 +1,26 @@
+'''InfoboxStores build the same DataFrames as the per-page dicts they replace.'''
+import pandas as pd
+
+from main import WikiInfobox
+
+PAGES = {
+    (11, 'Ken Barlow'): "{{Infobox character\n|name = Ken Barlow\n|alive = true\n|born = 9th August 1939\n"
+                        "|spouse(s) = [[Valerie Barlow]]<br>[[Janet Reid]]\n}}\nKen is a teacher.",
+    (12, 'Deirdre Barlow'): "{{Infobox character\n|name = {{PAGENAME}}\n|alive = false\n|died = 2015\n}}",
+    (13, 'Rita Tanner'): "{{Infobox character\n|alive = True\n|occupation = Shopkeeper\n}}",
+    (14, 'Empty'): "{{Infobox character\n}}",
+    (15, 'No infobox'): "Just text.",
+    (16, 'William Roache'): "{{Infobox actor\n|name = William Roache\n|character = [[Ken Barlow]]\n}}",
+}
+
+
+def test_stores_match_dicts():
+    wi = WikiInfobox(write_report=False)
+    wi.matched_raw_infoboxes = PAGES
+    parsed = {k: wi.parse_infobox(v) for k, v in PAGES.items()}
+    expected = wi.build_dfs_infobox(wi.sort_infoboxes_by_template(parsed, alert_empty=False))
+    actual = wi.build_dfs_infobox(wi.get_infobox_stores(alert_empty=False))
+    assert list(actual) == list(expected)
+    for template in expected:
+        pd.testing.assert_frame_equal(actual[template], expected[template])
+    assert actual['Infobox character']['alive'].dtype == bool